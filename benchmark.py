@@ -0,0 +1,221 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+from minesweeper import *
+
+# Board presets: (height, width, mines)
+PRESETS = {
+    "beginner": (9, 9, 10),
+    "intermediate": (16, 16, 40),
+    "expert": (16, 30, 99),
+    "large": (50, 50, 500),
+    "huge": (100, 100, 2000),
+}
+
+
+def positive_nonzero_int(value):
+    ivalue = int(value)
+    if ivalue <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive non-zero integer")
+    return ivalue
+
+
+def positive_float(value):
+    fvalue = float(value)
+    if not fvalue > 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return fvalue
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile (0-100) of values
+    using the nearest-rank method.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def play_game(height, width, mines, seed, use_numpy=False, stats=False, profile_path=None,
+              guess=False, linear=False, probing=False, budget=None, chunked=False):
+    """
+    Plays one game headlessly the same way main.py does:
+    the AI opens round(sqrt(h*w)) random safe cells, then
+    one add_knowledge call runs to a fixed point.
+    With guess, the AI keeps opening its lowest-risk cell while stuck
+    until it wins or hits a mine.
+    With linear, the AI row-reduces its constraints at every fixed point.
+    With probing, the AI probes every frontier cell for failed literals there.
+    With budget (seconds), every add_knowledge call stops after it and
+    is called again until the fixed point, like main.py --budget.
+    With chunked, the board is a ChunkedMinesweeper of the same mine density.
+    With stats, the AI's method counters are returned too.
+    With profile_path, a cProfile dump of add_knowledge is written there.
+    """
+    game_start = time.perf_counter()
+    # One stream for the board and then the random moves
+    rng = random.Random(seed)
+    if chunked:
+        game = ChunkedMinesweeper(height, width, mines / (height * width), seed=seed)
+    else:
+        game = Minesweeper(height=height, width=width, mines=mines, use_numpy=use_numpy, seed=rng)
+    ai = MinesweeperAI(height=height, width=width, game=game, seed=rng,
+                       stats=stats, profile=profile_path is not None,
+                       linear=linear, probing=probing)
+
+    for _ in range(round(math.sqrt(height * width))):
+        ai.init_knowledge()
+    calls = timed_add_knowledge(ai, budget)
+    lost = False
+    guesses = 0
+    while guess and not ai.solved():
+        cell = ai.make_random_move()
+        if cell is None:
+            break
+        guesses += 1
+        if game.is_mine(cell):
+            lost = True
+            break
+        ai.init_knowledge(cell, source="guess")
+        calls.extend(timed_add_knowledge(ai, budget))
+    if profile_path is not None:
+        ai.dump_profile(profile_path)
+
+    result = {
+        "seed": seed,
+        "win": ai.solved(),
+        "lost": lost,
+        "guesses": guesses,
+        "add_knowledge_time": sum(calls),
+        "add_knowledge_calls": calls,
+        "game_time": time.perf_counter() - game_start,
+        "peak_kb": ai.peak_kb,
+        "final_kb": ai.kb_size(),
+        "mines_found": ai.mine_count,
+        "safes_found": ai.safe_count,
+    }
+    if stats:
+        ai_stats = ai.get_stats()
+        result["functions"] = ai_stats["functions"]
+        result["passes"] = ai_stats["passes"]
+    return result
+
+
+def timed_add_knowledge(ai, budget=None):
+    # Times of the add_knowledge calls it takes to reach the fixed point
+    times = []
+    while True:
+        start = time.perf_counter()
+        done = ai.add_knowledge(deadline=None if budget is None else start + budget)
+        times.append(time.perf_counter() - start)
+        if done:
+            return times
+
+
+def summarize(name, height, width, mines, results, wall_time):
+    # Latency of every add_knowledge call, guesses make more than one per game
+    times = [t for r in results for t in r["add_knowledge_calls"]]
+    wins = sum(1 for r in results if r["win"])
+    losses = sum(1 for r in results if r["lost"])
+    games = len(results)
+    return {
+        "name": name,
+        "height": height,
+        "width": width,
+        "mines": mines,
+        "games": games,
+        "wall_time": wall_time,
+        "games_per_sec": games / wall_time if wall_time else 0.0,
+        "add_knowledge_p50": percentile(times, 50),
+        "add_knowledge_p99": percentile(times, 99),
+        "peak_kb": max((r["peak_kb"] for r in results), default=0),
+        "win_rate": wins / games if games else 0.0,
+        "lost_rate": losses / games if games else 0.0,
+        "stuck_rate": (games - wins - losses) / games if games else 0.0,
+        "guesses": sum(r["guesses"] for r in results),
+    }
+
+
+def run_benchmark(name, height, width, mines, games, seed, use_numpy=False, profile_dir=None,
+                  guess=False, linear=False, probing=False, budget=None, chunked=False):
+    results = []
+    start = time.perf_counter()
+    for k in range(games):
+        profile_path = None
+        if profile_dir is not None:
+            profile_path = os.path.join(profile_dir, f"{name.replace('/', '_')}-{seed + k}.prof")
+        results.append(play_game(height, width, mines, seed + k, use_numpy,
+                                 profile_path=profile_path, guess=guess,
+                                 linear=linear, probing=probing, budget=budget, chunked=chunked))
+    wall_time = time.perf_counter() - start
+    return summarize(name, height, width, mines, results, wall_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless MinesweeperAI benchmark")
+    parser.add_argument("-p", "--preset", choices=sorted(PRESETS), nargs="+", default=["beginner"],
+                        help="Board presets to run")
+    parser.add_argument("-s", "--setting", type=positive_nonzero_int, default=[], nargs=3,
+                        help="Board hight, Board width, The number of mines in the board (overrides --preset)")
+    parser.add_argument("-n", "--games", type=positive_nonzero_int, default=100,
+                        help="Number of games per board size")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the first game, game k uses seed + k")
+    parser.add_argument("--numpy", action="store_true",
+                        help="Generate the boards with the NumPy representation")
+    parser.add_argument("--guess", action="store_true",
+                        help="Keep playing with the AI's lowest-risk guesses when it is stuck")
+    parser.add_argument("--linear", action="store_true",
+                        help="Row-reduce the frontier constraints with NumPy when propagation stops")
+    parser.add_argument("--probing", action="store_true",
+                        help="Probe every frontier cell for failed literals when propagation stops")
+    parser.add_argument("--budget", type=positive_float, default=None,
+                        help="Time budget of an add_knowledge call in ms, the next call resumes the work left")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Generate the boards tile by tile as they are explored")
+    parser.add_argument("--profile-dir", default=None,
+                        help="Write a cProfile dump of every game to this directory")
+    parser.add_argument("-o", "--output", default="benchmark.json",
+                        help="Path of the JSON report")
+    args = parser.parse_args()
+
+    if args.setting:
+        h, w, m = args.setting
+        if (h * w) // 2 < m:
+            parser.error("too many mines!")
+        if h < 3 or w < 3:
+            parser.error("the size of board is too small!")
+        boards = [(f"{h}x{w}/{m}", h, w, m)]
+    else:
+        boards = [(p,) + PRESETS[p] for p in args.preset]
+
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    report = []
+    for name, h, w, m in boards:
+        summary = run_benchmark(name, h, w, m, args.games, args.seed, args.numpy, args.profile_dir,
+                                args.guess, args.linear, args.probing,
+                                None if args.budget is None else args.budget / 1000, args.chunked)
+        report.append(summary)
+        print(f"{name}: {summary['games_per_sec']:.2f} games/s, "
+              f"add_knowledge p50 {summary['add_knowledge_p50'] * 1000:.2f} ms, "
+              f"p99 {summary['add_knowledge_p99'] * 1000:.2f} ms, "
+              f"peak KB {summary['peak_kb']}, "
+              f"win {summary['win_rate']:.1%}, lost {summary['lost_rate']:.1%}, "
+              f"stuck {summary['stuck_rate']:.1%}")
+
+    with open(args.output, "w") as f:
+        json.dump({"seed": args.seed, "boards": report}, f, indent=2)
+    print("report written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
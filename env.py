@@ -0,0 +1,169 @@
+import argparse
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from minesweeper import NEIGHBOR_OFFSETS, neighbor_counts, place_mines
+
+
+def dilate(mask):
+    # Cells of a (n, height, width) bool mask or next to one of them
+    height, width = mask.shape[-2:]
+    padded = np.pad(mask, [(0, 0), (1, 1), (1, 1)])
+    result = mask.copy()
+    for di, dj in NEIGHBOR_OFFSETS:
+        result |= padded[:, 1 + di:1 + di + height, 1 + dj:1 + dj + width]
+    return result
+
+
+def flood(region, zero):
+    """
+    Grows a (n, height, width) bool region through the zero cells until
+    it stops changing, then adds its border: what clicking a zero cell
+    reveals. The rounds are bounded by the longest path through a region.
+    """
+    while True:
+        grown = dilate(region) & zero
+        grown |= region
+        if np.array_equal(grown, region):
+            return dilate(region)
+        region = grown
+
+
+class MinesweeperEnv():
+    """
+    num_boards games of the same size stepped together as stacked NumPy arrays.
+    Boards are placed like Minesweeper(use_numpy=True, seed=seed), so
+    reset([seed]) gives the same mines as that game.
+
+    Observations are int8 (num_boards, height, width) arrays: -1 for hidden
+    cells, the number of nearby mines for revealed ones.
+    """
+    def __init__(self, num_boards, height, width, mines):
+        if np is None:
+            raise ImportError("MinesweeperEnv needs numpy installed")
+        self.num_boards = num_boards
+        self.height = height
+        self.width = width
+        self.mines = mines
+
+        shape = (num_boards, height, width)
+        self.board = np.zeros(shape, dtype=bool)
+        self.counts = np.zeros(shape, dtype=np.int8)
+        # Safe cells with no mine around them
+        self.zero = np.zeros(shape, dtype=bool)
+        self.revealed = np.zeros(shape, dtype=bool)
+        self.lost = np.zeros(num_boards, dtype=bool)
+        self.won = np.zeros(num_boards, dtype=bool)
+
+    def reset(self, seeds=None, boards=None):
+        """
+        Places new mines on the given boards (all of them by default),
+        one int seed (the key of place_mines) per board, random if seeds is None.
+        Returns the observation of all boards.
+        """
+        if boards is None:
+            boards = np.arange(self.num_boards)
+        boards = np.asarray(boards)
+        if seeds is None:
+            seeds = [random.randrange(2 ** 32) for _ in boards]
+        if len(seeds) != len(boards):
+            raise ValueError(f"expected {len(boards)} seeds, got {len(seeds)}")
+
+        # Wrapped like Minesweeper's seeds, so negative and huge ones work too
+        keys = np.asarray([int(seed) % 2 ** 64 for seed in seeds], dtype=np.uint64)
+        board = place_mines(keys, self.height, self.width, self.mines)
+        board = board.reshape(len(boards), self.height, self.width)
+        counts = neighbor_counts(board)
+        self.board[boards] = board
+        self.counts[boards] = counts
+        self.zero[boards] = ~board & (counts == 0)
+        self.revealed[boards] = False
+        self.lost[boards] = False
+        self.won[boards] = False
+        return self.observe()
+
+    def observe(self):
+        return np.where(self.revealed, self.counts, np.int8(-1))
+
+    def done(self):
+        return self.lost | self.won
+
+    def step(self, actions):
+        """
+        Opens one cell per board, actions is a (num_boards,) array of flat
+        cell indices i * width + j. A zero cell opens its whole region and
+        its border, like Minesweeper.reveal. Finished boards ignore their action.
+        Returns (observation, reward, done): reward is 1 on the step a board
+        is won, -1 when a mine is hit and 0 otherwise.
+        """
+        actions = np.asarray(actions)
+        active = np.nonzero(~(self.lost | self.won))[0]
+        cells = actions[active]
+        rows = cells // self.width
+        cols = cells % self.width
+
+        hit = self.board[active, rows, cols]
+        self.lost[active[hit]] = True
+
+        opened = active[~hit]
+        rows = rows[~hit]
+        cols = cols[~hit]
+        self.revealed[opened, rows, cols] = True
+        zero = self.zero[opened, rows, cols]
+        if zero.any():
+            boards = opened[zero]
+            region = np.zeros((len(boards), self.height, self.width), dtype=bool)
+            region[np.arange(len(boards)), rows[zero], cols[zero]] = True
+            self.revealed[boards] |= flood(region, self.zero[boards])
+
+        reward = np.zeros(self.num_boards, dtype=np.int8)
+        reward[active[hit]] = -1
+        won = opened[self.revealed[opened].sum(axis=(1, 2)) == self.height * self.width - self.mines]
+        self.won[won] = True
+        reward[won] = 1
+        return self.observe(), reward, self.done()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Steps/sec of MinesweeperEnv with random hidden-cell actions")
+    parser.add_argument("-s", "--setting", type=int, default=[9, 9, 10], nargs=3,
+                        help="Board hight, Board width, The number of mines in the board")
+    parser.add_argument("-n", "--boards", type=int, default=1000,
+                        help="Number of boards stepped together")
+    parser.add_argument("--steps", type=int, default=200,
+                        help="Number of batched steps")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the first board, every reset takes the next seeds")
+    args = parser.parse_args()
+
+    h, w, m = args.setting
+    env = MinesweeperEnv(args.boards, h, w, m)
+    rng = np.random.default_rng(args.seed)
+    next_seed = args.seed
+    env.reset(range(next_seed, next_seed + args.boards))
+    next_seed += args.boards
+
+    start = time.perf_counter()
+    games = 0
+    for _ in range(args.steps):
+        # A random hidden cell on every board
+        hidden = ~env.revealed.reshape(args.boards, -1)
+        scores = rng.random(hidden.shape) * hidden
+        _, _, done = env.step(scores.argmax(axis=1))
+        finished = np.nonzero(done)[0]
+        if len(finished):
+            games += len(finished)
+            env.reset(range(next_seed, next_seed + len(finished)), finished)
+            next_seed += len(finished)
+    elapsed = time.perf_counter() - start
+    print(f"{h}x{w}/{m}: {args.boards * args.steps / elapsed:.0f} steps/s, "
+          f"{games / elapsed:.0f} games/s on {args.boards} boards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from functools import lru_cache
+from math import comb
+
+# Backtracking steps allowed per component before falling back to an estimate
+MAX_STEPS = 200000
+# Larger components are estimated directly (and would exceed the recursion limit)
+MAX_COMPONENT_CELLS = 400
+
+
+def split_components(constraints):
+    """
+    Groups (cells, count) constraints into independent components:
+    two constraints are in the same component if they share a cell.
+    Returns a list of (cells, constraints), cells in traversal order
+    so that constraints close early during enumeration.
+    """
+    cell_constraints = {}
+    for n, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            cell_constraints.setdefault(cell, []).append(n)
+
+    seen = set()
+    components = []
+    for start in range(len(constraints)):
+        if start in seen:
+            continue
+        seen.add(start)
+        stack = [start]
+        cells = []
+        cell_seen = set()
+        members = []
+        while stack:
+            n = stack.pop()
+            members.append(constraints[n])
+            for cell in sorted(constraints[n][0]):
+                if cell in cell_seen:
+                    continue
+                cell_seen.add(cell)
+                cells.append(cell)
+                for m in cell_constraints[cell]:
+                    if m not in seen:
+                        seen.add(m)
+                        stack.append(m)
+        components.append((cells, members))
+    return components
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def enumerate_component(cells, constraints):
+    """
+    Counts the mine configurations of one component.
+    cells is a tuple of cells, constraints a tuple of (cells tuple, count).
+    Returns (totals, per_cell): totals[k] is the number of configurations
+    with k mines, per_cell[k][n] how many of them have a mine on cells[n].
+    Returns None past MAX_STEPS, which is cached like any other result.
+    """
+    index = {cell: n for n, cell in enumerate(cells)}
+    cell_constraints = [[] for _ in cells]
+    need = []
+    left = []
+    for n, (constraint_cells, count) in enumerate(constraints):
+        need.append(count)
+        left.append(len(constraint_cells))
+        for cell in constraint_cells:
+            cell_constraints[index[cell]].append(n)
+    have = [0] * len(constraints)
+    assignment = [0] * len(cells)
+    totals = {}
+    per_cell = {}
+    steps = 0
+
+    def place(n, mines):
+        nonlocal steps
+        steps += 1
+        if steps > MAX_STEPS:
+            raise BudgetExceeded()
+        if n == len(cells):
+            totals[mines] = totals.get(mines, 0) + 1
+            row = per_cell.setdefault(mines, [0] * len(cells))
+            for m in range(len(cells)):
+                row[m] += assignment[m]
+            return
+        for v in (0, 1):
+            for c in cell_constraints[n]:
+                have[c] += v
+                left[c] -= 1
+            # Prune as soon as a constraint can no longer be met
+            ok = True
+            for c in cell_constraints[n]:
+                if have[c] > need[c] or have[c] + left[c] < need[c]:
+                    ok = False
+                    break
+            if ok:
+                assignment[n] = v
+                place(n + 1, mines + v)
+            for c in cell_constraints[n]:
+                have[c] -= v
+                left[c] += 1
+        assignment[n] = 0
+
+    try:
+        place(0, 0)
+    except BudgetExceeded:
+        return None
+    return totals, per_cell
+
+
+def convolve(a, b):
+    # Product of two {mines: ways} distributions
+    result = {}
+    for ka, wa in a.items():
+        for kb, wb in b.items():
+            result[ka + kb] = result.get(ka + kb, 0) + wa * wb
+    return result
+
+
+def estimate(cells, constraints):
+    # Mine probability of each cell from its densest constraint alone
+    probabilities = {}
+    for constraint_cells, count in constraints:
+        for cell in constraint_cells:
+            probabilities[cell] = max(probabilities.get(cell, 0.0), count / len(constraint_cells))
+    return probabilities
+
+
+def mine_probabilities(constraints, other_count, mines_left, independent=False):
+    """
+    Returns ({cell: probability}, other_probability) for the cells of the
+    (cells, count) constraints and for each of the other_count unknown cells
+    that are in no constraint, given mines_left mines among all of them.
+    With independent, the components are not weighted by the placements
+    of the other mines, for boards where counting them is out of reach.
+    """
+    probabilities = {}
+    exact = []
+    for cells, members in split_components(constraints):
+        key = tuple((tuple(sorted(c)), count) for c, count in members)
+        result = None
+        if len(cells) <= MAX_COMPONENT_CELLS:
+            result = enumerate_component(tuple(cells), key)
+        # No configuration at all means contradicting constraints
+        if result is None or not result[0]:
+            probabilities.update(estimate(cells, key))
+            continue
+        exact.append((cells,) + result)
+
+    # Mines expected in estimated components are not available to the others
+    mines_left -= round(sum(probabilities.values()))
+
+    # prefix[i] combines the components before i, suffix[i] those from i on
+    prefix = [{0: 1}]
+    for _, totals, _ in exact:
+        prefix.append(convolve(prefix[-1], totals))
+    suffix = [{0: 1}]
+    for _, totals, _ in reversed(exact):
+        suffix.append(convolve(suffix[-1], totals))
+    suffix.reverse()
+
+    def ways(distribution, mines):
+        # Configurations of the components times placements of the rest among other cells
+        return sum(w * comb(other_count, mines - k) for k, w in distribution.items() if 0 <= mines - k <= other_count)
+
+    total = 0 if independent else ways(prefix[-1], mines_left)
+    if total == 0:
+        # The mine count does not fit (e.g. after estimates), use each component alone
+        for cells, totals, per_cell in exact:
+            count = sum(totals.values())
+            for m, cell in enumerate(cells):
+                probabilities[cell] = sum(row[m] for row in per_cell.values()) / count
+        other = mines_left / other_count if other_count else 0.0
+        return probabilities, min(max(other, 0.0), 1.0)
+
+    for n, (cells, totals, per_cell) in enumerate(exact):
+        others = convolve(prefix[n], suffix[n + 1])
+        mines = [0] * len(cells)
+        for k, row in per_cell.items():
+            weight = ways(others, mines_left - k)
+            for m in range(len(cells)):
+                mines[m] += row[m] * weight
+        for m, cell in enumerate(cells):
+            probabilities[cell] = mines[m] / total
+
+    other = 0.0
+    if other_count:
+        expected = sum(w * comb(other_count, mines_left - k) * (mines_left - k)
+                       for k, w in prefix[-1].items() if 0 <= mines_left - k <= other_count)
+        other = expected / total / other_count
+    return probabilities, other
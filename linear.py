@@ -0,0 +1,85 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from frontier import split_components
+
+# Entries closer to 0 than this are 0 after floating point elimination
+EPSILON = 1e-9
+
+
+def constraint_matrix(cells, constraints):
+    """
+    Returns the augmented matrix [A | b] of one component: a row per
+    (cells, count) constraint, A[r, n] is 1 if cells[n] is in it and
+    b[r] its count.
+    """
+    index = {cell: n for n, cell in enumerate(cells)}
+    matrix = np.zeros((len(constraints), len(cells) + 1))
+    for r, (constraint_cells, count) in enumerate(constraints):
+        matrix[r, [index[cell] for cell in constraint_cells]] = 1
+        matrix[r, -1] = count
+    return matrix
+
+
+def row_reduce(matrix):
+    # Reduced row echelon form in place, with partial pivoting. Returns the rank
+    rows, columns = matrix.shape
+    rank = 0
+    for c in range(columns - 1):
+        if rank == rows:
+            break
+        pivot = rank + np.argmax(np.abs(matrix[rank:, c]))
+        if abs(matrix[pivot, c]) < EPSILON:
+            continue
+        matrix[[rank, pivot]] = matrix[[pivot, rank]]
+        matrix[rank] /= matrix[rank, c]
+        # Every other row at once
+        factors = matrix[:, c].copy()
+        factors[rank] = 0
+        matrix -= np.outer(factors, matrix[rank])
+        rank += 1
+    matrix[np.abs(matrix) < EPSILON] = 0
+    return rank
+
+
+def bounded_cells(matrix):
+    """
+    Returns (mines, safes) column masks forced by the rows of a reduced
+    matrix. Cells are 0 or 1, so a row ranges from the sum of its
+    negative coefficients to the sum of its positive ones, and a row at
+    one of its bounds fixes every cell in it.
+    """
+    coefficients = matrix[:, :-1]
+    b = matrix[:, -1]
+    positive = coefficients > 0
+    negative = coefficients < 0
+    low = np.where(negative, coefficients, 0).sum(axis=1)
+    high = np.where(positive, coefficients, 0).sum(axis=1)
+    nonzero = (positive | negative).any(axis=1)
+    at_low = (nonzero & (np.abs(b - low) < EPSILON))[:, None]
+    at_high = (nonzero & (np.abs(b - high) < EPSILON))[:, None]
+    mines = ((at_low & negative) | (at_high & positive)).any(axis=0)
+    safes = ((at_low & positive) | (at_high & negative)).any(axis=0)
+    return mines, safes
+
+
+def linear_deductions(constraints):
+    """
+    Returns (mines, safes), the cells forced by a list of (cells, count)
+    constraints once each independent component of them is row-reduced.
+    This finds what any combination of the constraints proves, not just
+    pairs of them, e.g. chains of overlapping constraints along a wall.
+    """
+    if np is None:
+        raise ImportError("linear reasoning needs numpy installed")
+    mines = []
+    safes = []
+    for cells, members in split_components(constraints):
+        matrix = constraint_matrix(cells, members)
+        row_reduce(matrix)
+        mine_mask, safe_mask = bounded_cells(matrix)
+        mines.extend(cell for cell, mine in zip(cells, mine_mask) if mine)
+        safes.extend(cell for cell, safe in zip(cells, safe_mask) if safe)
+    return mines, safes
@@ -1,19 +1,45 @@
 import pygame
 import sys
-import time
 import argparse
 import math
+import queue
+import random
+import threading
+import time
 
 from minesweeper import *
+from renderer import *
+from noguess import generate
+from replay import save_replay
 def positive_nonzero_int(value):
     ivalue = int(value)
     if ivalue <= 0:
         raise argparse.ArgumentTypeError(f"{value} is not a positive non-zero integer")
     return ivalue
 
+def positive_float(value):
+    fvalue = float(value)
+    if not fvalue > 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return fvalue
+
 parser = argparse.ArgumentParser()
 parser.add_argument("-s", "--setting",type=positive_nonzero_int, default=[], nargs=3, 
                     help="Board hight, Board width, The number of mines in the board")
+parser.add_argument("--seed", type=int, default=None,
+                    help="Seed the per-game seeds are drawn from (random if not given)")
+parser.add_argument("-r", "--record", default=None,
+                    help="Write a replay file of the current game to this path")
+parser.add_argument("--stats", action="store_true",
+                    help="Print the AI's method counters after every AI move")
+parser.add_argument("--no-guess", action="store_true",
+                    help="Generate boards the AI solves from the first click without guessing")
+parser.add_argument("--linear", action="store_true",
+                    help="Row-reduce the frontier constraints with NumPy when propagation stops")
+parser.add_argument("--probing", action="store_true",
+                    help="Probe every frontier cell for failed literals when propagation stops")
+parser.add_argument("--budget", type=positive_float, default=None,
+                    help="Time budget of an AI Move in ms, the next AI Move resumes the work left")
 
 
 args = parser.parse_args()
@@ -30,6 +56,10 @@ else:
     if h < 3 or w < 3:
         print("the size of board is too small!")
         exit(1)
+# noguess.generate keeps the first click and its 8 neighbors free of mines
+if args.no_guess and m > h * w - 9:
+    print("too many mines to keep the first click clear!")
+    exit(1)
 HEIGHT = h
 WIDTH = w
 MINES = m
@@ -37,19 +67,83 @@ print("HEIGHT =", h)
 print("WIDTH =", w)
 print("MINES =", m)
 
-# Colors
-BLACK = (0, 0, 0)
-GRAY = (180, 180, 180)
-WHITE = (255, 255, 255)
-YELLOW = (240, 230, 140)
+# Every game gets its own seed, printed so it can be played again
+seeds = random.Random(args.seed)
 
-NUM_COLOR = [(0, 0, 255), (0, 128, 0), (255, 0, 0), (0, 0, 128),
-             (128, 0, 0), (0, 128, 128), (0, 0, 0), (128, 128, 128)]
+
+def new_game():
+    seed = seeds.randrange(2 ** 32)
+    print("SEED =", seed)
+    # The first click of a no-guess board, None for random hints
+    first = None
+    if args.no_guess:
+        game, first = generate(HEIGHT, WIDTH, MINES, seed=seed)
+    else:
+        game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES, seed=seed)
+    return game, make_ai(game, seed + 1), first
+
+
+def make_ai(game, seed):
+    return MinesweeperAI(height=HEIGHT, width=WIDTH, game=game, seed=seed,
+                         stats=args.stats, linear=args.linear, probing=args.probing)
+
+
+def checkpoint():
+    # What Undo goes back to: the board state before an action, the AI keeps its own
+    ai.checkpoint()
+    history.append((set(revealed), set(flags), set(safes), lost, stuck, win))
+
+
+def undo():
+    """
+    Goes back to the last checkpoint. The board sets are restored as saved,
+    the AI pops its trail of changes back to its matching checkpoint.
+    """
+    global revealed, flags, safes, lost, stuck, win
+    revealed, flags, safes, lost, stuck, win = history.pop()
+    ai.undo()
+
+
+def record():
+    if args.record:
+        save_replay(args.record, game, ai)
+
+
+def ai_move(ai, game, guess, results):
+    """
+    Runs on the worker thread: guesses first if guess is set, then
+    propagates, for at most --budget ms. Every cell found is put on
+    results as it is deduced, ("done",) is put last.
+    """
+    deadline = None
+    if args.budget is not None:
+        deadline = time.perf_counter() + args.budget / 1000
+    if guess:
+        # Stuck: open the cell least likely to be a mine
+        guess = ai.make_random_move()
+        if guess is not None:
+            results.put(("guess", guess))
+            if game.is_mine(guess):
+                results.put(("done",))
+                return
+            ai.init_knowledge(guess, source="guess")
+    for c in ai.deductions(deadline):
+        results.put(("deduced", c))
+    results.put(("done",))
+
+
+def stop_ai():
+    # Cancels the running AI move and waits for the worker, it stops after its current pass
+    if ai_thread is not None:
+        ai.cancel()
+        ai_thread.join()
 
 # Create game
 pygame.init()
 size = width, height = 900, 500
 screen = pygame.display.set_mode(size)
+clock = pygame.time.Clock()
+FPS = 30
 
 # Fonts
 OPEN_SANS = "assets/fonts/OpenSans-Regular.ttf"
@@ -71,8 +165,26 @@ mine = pygame.image.load("assets/images/mine.png")
 mine = pygame.transform.scale(mine, (cell_size, cell_size))
 
 # Create game and AI agent
-game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-ai = MinesweeperAI(height=HEIGHT, width=WIDTH, game=game)
+game, ai, first = new_game()
+renderer = BoardRenderer(screen, game, board_origin, cell_size, smallFont, flag, mine)
+
+# AI Move button
+aiButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+# Reset button
+resetButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+# Undo button
+undoButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 90,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+# Area of the Lost / Stuck / Win text
+statusRect = pygame.Rect((2 / 3) * width, (2 / 3) * height - 25, width / 3, 50)
 
 
 # Keep track of revealed cells, flagged cells, and if a mine was hit
@@ -83,6 +195,8 @@ lost = False
 stuck = False
 win = False
 revealed_count = 0
+# Checkpoints before every user and AI move, see undo
+history = []
 ans_board = game.ans_board
 print("initiate board:")
 for b in game.ans_board:
@@ -91,206 +205,112 @@ for b in game.ans_board:
 # Show instructions initially
 instructions = True
 init_flag = True
+# The whole screen is drawn again when set, otherwise only what changed
+full_redraw = True
+shown_status = None
+# Worker thread of the running AI move and the cells it streams back
+ai_thread = None
+ai_results = None
 
 while True:
+    clock.tick(FPS)
+    clicks = []
     # Check if game quit
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            stop_ai()
+            record()
             sys.exit()
-
-    screen.fill(BLACK)
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (1, 3):
+            clicks.append(event)
 
     # Show game instructions
     if instructions:
-
-        # Title
-        title = largeFont.render("Play Minesweeper", True, WHITE)
-        titleRect = title.get_rect()
-        titleRect.center = ((width / 2), 50)
-        screen.blit(title, titleRect)
-
-        # Rules
-        rules = [
-            "Click a cell to reveal it.",
-            "Right-click a cell to mark it as a mine.",
-            "Mark all mines successfully to win!"
-        ]
-        for i, rule in enumerate(rules):
-            line = smallFont.render(rule, True, WHITE)
-            lineRect = line.get_rect()
-            lineRect.center = ((width / 2), 150 + 30 * i)
-            screen.blit(line, lineRect)
-
-        # Play game button
-        buttonRect = pygame.Rect((width / 4), (3 / 4) * height, width / 2, 50)
-        buttonText = mediumFont.render("Play Game", True, BLACK)
-        buttonTextRect = buttonText.get_rect()
-        buttonTextRect.center = buttonRect.center
-        pygame.draw.rect(screen, WHITE, buttonRect)
-        screen.blit(buttonText, buttonTextRect)
+        if full_redraw:
+            full_redraw = False
+            screen.fill(BLACK)
+
+            # Title
+            title = largeFont.render("Play Minesweeper", True, WHITE)
+            titleRect = title.get_rect()
+            titleRect.center = ((width / 2), 50)
+            screen.blit(title, titleRect)
+
+            # Rules
+            rules = [
+                "Click a cell to reveal it.",
+                "Right-click a cell to mark it as a mine.",
+                "Mark all mines successfully to win!",
+                "When the AI is stuck, AI Move guesses the safest cell."
+            ]
+            for i, rule in enumerate(rules):
+                line = smallFont.render(rule, True, WHITE)
+                lineRect = line.get_rect()
+                lineRect.center = ((width / 2), 150 + 30 * i)
+                screen.blit(line, lineRect)
+
+            # Play game button
+            buttonRect = pygame.Rect((width / 4), (3 / 4) * height, width / 2, 50)
+            buttonText = mediumFont.render("Play Game", True, BLACK)
+            buttonTextRect = buttonText.get_rect()
+            buttonTextRect.center = buttonRect.center
+            pygame.draw.rect(screen, WHITE, buttonRect)
+            screen.blit(buttonText, buttonTextRect)
+            pygame.display.flip()
 
         # Check if play button clicked
-        click, _, _ = pygame.mouse.get_pressed()
-        if click == 1:
-            mouse = pygame.mouse.get_pos()
-            if buttonRect.collidepoint(mouse):
+        for event in clicks:
+            if event.button == 1 and buttonRect.collidepoint(event.pos):
                 instructions = False
-                time.sleep(0.3)
-
-        pygame.display.flip()
+                full_redraw = True
         continue
 
-    # Draw board
-    cells = []
-    for i in range(HEIGHT):
-        row = []
-        for j in range(WIDTH):
-
-            # Draw rectangle for cell
-            rect = pygame.Rect(
-                board_origin[0] + j * cell_size,
-                board_origin[1] + i * cell_size,
-                cell_size, cell_size
-            )
-            if (i, j) in revealed:
-                pygame.draw.rect(screen, WHITE, rect)
-            else:
-                pygame.draw.rect(screen, GRAY, rect)
-            pygame.draw.rect(screen, WHITE, rect, 3)
-
-            # Add a mine, flag, or number if needed
-            if game.is_mine((i, j)) and lost:
-                screen.blit(mine, rect)
-            elif (i, j) in flags:
-                screen.blit(flag, rect)
-            elif game.is_mine((i, j)) and stuck:
-                screen.blit(mine, rect)
-            elif (i, j) in revealed:
-                nearby = game.nearby_mines((i, j))
-                if nearby:
-                    neighbors = smallFont.render(
-                        str(nearby),
-                        True, NUM_COLOR[nearby - 1]
-                    )
-                    neighborsTextRect = neighbors.get_rect()
-                    neighborsTextRect.center = rect.center
-                    screen.blit(neighbors, neighborsTextRect)
-            elif (i, j) in safes:
-                nearby = game.nearby_mines((i, j))
-                if nearby:
-                    neighbors = smallFont.render(
-                        str(nearby),
-                        True, GRAY
-                    )
-                    pygame.draw.rect(screen, YELLOW, rect)
-                    neighborsTextRect = neighbors.get_rect()
-                    neighborsTextRect.center = rect.center
-                    screen.blit(neighbors, neighborsTextRect)
-                else:
-                    pygame.draw.rect(screen, YELLOW, rect)
-            elif (lost or stuck) and (i, j) not in safes:
-                nearby = game.nearby_mines((i, j))
-                if nearby:
-                    neighbors = smallFont.render(
-                        str(nearby),
-                        True, BLACK
-                    )
-                    pygame.draw.rect(screen, GRAY, rect)
-                    neighborsTextRect = neighbors.get_rect()
-                    neighborsTextRect.center = rect.center
-                    screen.blit(neighbors, neighborsTextRect)
-                else:
-                    pygame.draw.rect(screen, GRAY, rect)
-
-            row.append(rect)
-        cells.append(row)
-        if revealed_count >= round(math.sqrt(h*w)) and init_flag:
-            init_flag = False
-
-    # AI Move button
-    aiButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("AI Move", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = aiButton.center
-    pygame.draw.rect(screen, WHITE, aiButton)
-    screen.blit(buttonText, buttonRect)
-
-    # Reset button
-    resetButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("Reset", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = resetButton.center
-    pygame.draw.rect(screen, WHITE, resetButton)
-    screen.blit(buttonText, buttonRect)
-
-    # Display text
-    if lost:
-        text = "Lost"
-    elif stuck:
-        text = "Stuck"
-    elif win:
-        text = "Win"
-    else:
-        text = ""
-    text = mediumFont.render(text, True, WHITE)
-    textRect = text.get_rect()
-    textRect.center = ((5 / 6) * width, (2 / 3) * height)
-    screen.blit(text, textRect)
-
     move = None
 
-    left, _, right = pygame.mouse.get_pressed()
+    # Cells streamed back by the AI worker
+    while ai_results is not None:
+        try:
+            message = ai_results.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == "deduced":
+            c = message[1]
+            if c[2] == 1:
+                flags.add(c[:2])
+            else:
+                safes.add(c[:2])
+        elif message[0] == "guess":
+            move = message[1]
+        elif message[0] == "done":
+            ai_thread.join()
+            ai_thread = None
+            ai_results = None
+            print("KB len:", ai.kb_size())
+            print("Known mines:", ai.mine_count)
+            print("Unknown mines:", len(game.mines) - ai.mine_count)
+            print("Safe", ai.safe_count)
+            if args.stats:
+                stats = ai.get_stats()
+                print("Passes:", stats["passes"], "peak KB:", stats["peak_kb"])
+                for name, counter in stats["functions"].items():
+                    print(f"  {name}: {counter['calls']} calls, {counter['time'] * 1000:.2f} ms")
 
-    
-    if init_flag:
-        move = ai.init_knowledge()
-        revealed_count += 1
-    # Check for a right-click to toggle flagging    
-    elif right == 1 and not lost:
-        mouse = pygame.mouse.get_pos()
-        for i in range(HEIGHT):
-            for j in range(WIDTH):
-                if cells[i][j].collidepoint(mouse) and (i, j) not in revealed:
-                    if (i, j) in flags:
-                        flags.remove((i, j))
-                    else:
-                        flags.add((i, j))
-                    time.sleep(0.2)
-                    
-    elif left == 1:
-        mouse = pygame.mouse.get_pos()
-        # TODO: AI move part
-        if aiButton.collidepoint(mouse) and not lost:
-            time.sleep(0.2)
-
-            ai.add_knowledge()
-            print("KB len:", len(ai.knowledge))
-            print("KB0 len:", len(ai.knowledge0))
-            print("Known mines:", len(ai.mines))
-            print("Unknown mines:", len(game.mines) - len(ai.mines))
-            print("Safe", len(ai.safes))
-            
             # check the board
             if not ai.mark_board(game.board, "Total check"):
                 print("ERROR!")
-                time.sleep(1)
             safe_list = []
             for s in ai.safes:
                 safe_list.append(s[:2])
             safes = set(safe_list)
 
-            if len(ai.mines) == len(game.mines):
+            if ai.solved():
                 find_mine = ai.mines.copy()
                 mine_list = []
                 for m in find_mine:
                     mine_list.append(m[:2])
                 flags = set(mine_list)
+                # A guess can win a game that was stuck
+                stuck = False
                 win = True
                 print("WIN!!")
 
@@ -300,13 +320,49 @@ while True:
                 for m in find_mine:
                     mine_list.append(m[:2])
                 flags = set(mine_list)
-                stuck = True
-                print("Stuck")
-                
+                # Out of budget, the next AI Move goes on deducing instead of guessing
+                stuck = not ai.has_work()
+                print("Stuck" if stuck else "Budget reached")
+            record()
+
+    if init_flag and first is not None:
+        # A no-guess board starts from its first click only
+        move = ai.init_knowledge(first)
+        init_flag = False
+    elif init_flag:
+        move = ai.init_knowledge()
+        revealed_count += 1
+        if revealed_count >= round(math.sqrt(h*w)):
+            init_flag = False
+
+    for event in clicks:
+        # Check for a right-click to toggle flagging
+        if event.button == 3:
+            cell = renderer.cell_at(event.pos)
+            if cell is not None and cell not in revealed and not lost:
+                if cell in flags:
+                    flags.remove(cell)
+                else:
+                    flags.add(cell)
+
+        # AI move part, the AI runs on a worker thread so the window stays responsive
+        elif aiButton.collidepoint(event.pos):
+            if not lost and not init_flag and ai_thread is None:
+                checkpoint()
+                ai_results = queue.Queue()
+                ai_thread = threading.Thread(target=ai_move, args=(ai, game, stuck and not win, ai_results),
+                                             daemon=True)
+                ai_thread.start()
+
         # Reset
-        elif resetButton.collidepoint(mouse):
-            game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-            ai = MinesweeperAI(height=HEIGHT, width=WIDTH, game=game)
+        elif resetButton.collidepoint(event.pos):
+            stop_ai()
+            ai_thread = None
+            ai_results = None
+            record()
+            game, ai, first = new_game()
+            renderer.reset(game)
+            full_redraw = True
             revealed = set()
             flags = set()
             safes = set()
@@ -315,45 +371,75 @@ while True:
             win = False
             init_flag = True
             revealed_count = 0
+            history = []
+            move = None
             ans_board = game.ans_board
             print("initiate board:")
             for b in game.ans_board:
                 print(b)
-            continue
-
-        # User-made move
-        elif not lost:
-            for i in range(HEIGHT):
-                for j in range(WIDTH):
-                    if (cells[i][j].collidepoint(mouse)
-                            and (i, j) not in flags
-                            and (i, j) not in revealed):
-                        move = (i, j)
-                        ai.init_knowledge(move)
+            break
+
+        # Undo the last move, not while the AI is changing the KB
+        elif undoButton.collidepoint(event.pos):
+            if history and ai_thread is None:
+                undo()
+                move = None
+
+        # User-made move, not while the AI is changing the KB
+        elif not lost and ai_thread is None:
+            cell = renderer.cell_at(event.pos)
+            if cell is not None and cell not in flags and cell not in revealed:
+                checkpoint()
+                move = cell
+                ai.init_knowledge(move)
 
     def make_move(move):
         
         if game.is_mine(move):
             return True
-        else:
-            # get the number of nearby mines
-            nearby = game.nearby_mines(move)
-            revealed.add(move)
-            if not nearby:
-                # Loop over all cells within one row and column
-                for i in range(move[0] - 1, move[0] + 2):
-                    for j in range(move[1] - 1, move[1] + 2):
-
-                        # Ignore the cell itself
-                        if (i, j) == move:
-                            continue
-
-                        # Add to the cell collection if the cell is not yet explored
-                        # and is not the mine already none
-                        if 0 <= i < HEIGHT and 0 <= j < WIDTH and (i, j) not in revealed:
-                            make_move((i, j))
+        # A zero cell opens its whole region at once
+        revealed.update(game.reveal(move))
     if move:
         if make_move(move):
             lost = True
 
-    pygame.display.flip()
+    dirty = []
+    if full_redraw:
+        screen.fill(BLACK)
+        renderer.invalidate()
+        shown_status = None
+        for button, label in ((aiButton, "AI Move"), (resetButton, "Reset"), (undoButton, "Undo")):
+            buttonText = mediumFont.render(label, True, BLACK)
+            buttonRect = buttonText.get_rect()
+            buttonRect.center = button.center
+            pygame.draw.rect(screen, WHITE, button)
+            screen.blit(buttonText, buttonRect)
+
+    # Draw the cells that changed
+    dirty += renderer.draw(revealed, flags, safes, lost, stuck)
+
+    # Display text
+    if lost:
+        status = "Lost"
+    elif ai_thread is not None:
+        status = "Thinking"
+    elif stuck:
+        status = "Stuck"
+    elif win:
+        status = "Win"
+    else:
+        status = ""
+    if status != shown_status:
+        shown_status = status
+        pygame.draw.rect(screen, BLACK, statusRect)
+        text = mediumFont.render(status, True, WHITE)
+        textRect = text.get_rect()
+        textRect.center = ((5 / 6) * width, (2 / 3) * height)
+        screen.blit(text, textRect)
+        dirty.append(statusRect)
+
+    if full_redraw:
+        full_redraw = False
+        pygame.display.flip()
+    elif dirty:
+        pygame.display.update(dirty)
@@ -0,0 +1,252 @@
+import argparse
+import gc
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from minesweeper import *
+
+FIXTURE_DIR = "fixtures"
+BASELINE = "microbench_baseline.json"
+# Every case runs at least this long in total, on top of --repeat runs
+MIN_TIME = 0.05
+# Times a case over the tolerance is measured again before it counts as slower
+RETRIES = 2
+# Slowdowns smaller than this (in seconds) are timer noise, never a regression
+NOISE_FLOOR = 0.0001
+# Board fixtures: (name, height, width, mines, seed)
+FIXTURES = [
+    ("beginner", 9, 9, 10, 1),
+    ("expert", 16, 30, 99, 2),
+    ("large", 50, 50, 500, 3),
+    ("huge", 100, 100, 2000, 4),
+]
+
+
+def write_fixtures():
+    """
+    Writes the board fixtures: the mines of a seeded board and
+    round(sqrt(h*w)) safe hint cells. They are checked in, so the
+    boards stay fixed when the board generation changes.
+    """
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, h, w, m, seed in FIXTURES:
+        rng = random.Random(seed)
+        game = Minesweeper(height=h, width=w, mines=m, seed=rng)
+        hints = []
+        for _ in range(round(math.sqrt(h * w))):
+            hints.append(game.safe_hint(rng, hints))
+        fixture = {
+            "height": h,
+            "width": w,
+            "mines": sorted([i, j] for i, j in game.mines),
+            "hints": [[i, j] for i, j in hints],
+        }
+        with open(os.path.join(FIXTURE_DIR, name + ".json"), "w") as f:
+            json.dump(fixture, f, separators=(",", ":"))
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name + ".json")) as f:
+        fixture = json.load(f)
+    fixture["hints"] = [tuple(cell) for cell in fixture["hints"]]
+    return fixture
+
+
+def new_ai(fixture, **options):
+    game = Minesweeper.from_mines(fixture["height"], fixture["width"], fixture["mines"])
+    ai = MinesweeperAI(height=fixture["height"], width=fixture["width"], game=game, **options)
+    for cell in fixture["hints"]:
+        ai.init_knowledge(cell)
+    return ai
+
+
+def expanded(fixture):
+    # An AI with the constraints of the hints queued, before any constraint tier ran
+    ai = new_ai(fixture)
+    while ai.queue:
+        ai.expand(ai.queue.pop())
+    return ai
+
+
+def at_fixed_point(fixture, **options):
+    # An AI after add_knowledge, with its global stage due again
+    ai = new_ai(fixture, **options)
+    ai.add_knowledge()
+    ai.constraints_dirty = True
+    return ai
+
+
+def cases(fixture):
+    """
+    Returns (function name, setup, run) per hot path. setup builds a
+    fresh state outside the timing, run(state) is what is timed.
+    check_global[linear] is only there with numpy installed.
+    """
+    h, w = fixture["height"], fixture["width"]
+    cells = [(i, j) for i in range(h) for j in range(w)]
+
+    def nearby(game):
+        for cell in cells:
+            game.nearby_mines(cell)
+
+    def init_neighbors(ai):
+        for cell in fixture["hints"]:
+            ai.init_neighbors(cell)
+
+    def pending():
+        ai = expanded(fixture)
+        return ai, list(ai.pending_constraints)
+
+    def overlapping():
+        # The constraints the count rules left to the overlap checks
+        ai = expanded(fixture)
+        while ai.pending_constraints:
+            ai.check_constraint(ai.pending_constraints.popleft())
+        return ai, list(ai.overlap_constraints)
+
+    def frontier():
+        # Every cell in a constraint, as it is on the board
+        ai = expanded(fixture)
+        game = ai.game
+        cells = [divmod(k, w) for k in ai.cell_constraints]
+        return ai, [(i, j, 1 if game.is_mine((i, j)) else -1) for i, j in cells]
+
+    def step_constraints(ai):
+        while ai.step_constraints():
+            pass
+
+    game = lambda: Minesweeper.from_mines(h, w, fixture["mines"])
+    return [
+        ("Minesweeper.init_board", game, lambda g: g.init_board()),
+        ("Minesweeper.nearby_mines", game, nearby),
+        ("MinesweeperAI.init_neighbors", lambda: new_ai(fixture), init_neighbors),
+        ("MinesweeperAI.check_constraint", pending,
+         lambda state: [state[0].check_constraint(c) for c in state[1]]),
+        ("MinesweeperAI.check_overlaps", overlapping,
+         lambda state: [state[0].check_overlaps(c) for c in state[1]]),
+        ("MinesweeperAI.resolve_constraints", frontier,
+         lambda state: [state[0].resolve_constraints(c) for c in state[1]]),
+        ("MinesweeperAI.step_constraints", lambda: expanded(fixture), step_constraints),
+        ("MinesweeperAI.add_knowledge", lambda: new_ai(fixture), lambda ai: ai.add_knowledge()),
+        ("MinesweeperAI.check_global[probing]", lambda: at_fixed_point(fixture, probing=True),
+         lambda ai: ai.check_global()),
+    ] + ([] if np is None else [
+        ("MinesweeperAI.check_global[linear]", lambda: at_fixed_point(fixture, linear=True),
+         lambda ai: ai.check_global()),
+    ])
+
+
+def measure(setup, run, repeat):
+    # Best of at least repeat runs and MIN_TIME, each on a fresh state and without GC pauses like timeit
+    best = float("inf")
+    total = 0.0
+    runs = 0
+    while runs < repeat or total < MIN_TIME:
+        state = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+    return best
+
+
+def calibrate(repeat):
+    """
+    Times a fixed pure-Python loop (dict, set and tuple work like the AI's).
+    It runs right before every case and the case is compared in units of
+    it, so a machine (or a moment) that is uniformly slower or faster
+    than the baseline run is not a regression.
+    """
+    def loop(_):
+        seen = {}
+        for k in range(20000):
+            cell = (k // 100, k % 100)
+            seen.setdefault(cell, set()).add(k & 7)
+        return seen
+    return measure(lambda: None, loop, repeat)
+
+
+def suite(names):
+    # case name -> (setup, run)
+    return {f"{function}/{name}": (setup, run)
+            for name in names for function, setup, run in cases(load_fixture(name))}
+
+
+def run_case(setup, run, repeat):
+    # (seconds, seconds relative to the calibration loop)
+    unit = calibrate(repeat)
+    elapsed = measure(setup, run, repeat)
+    return elapsed, elapsed / unit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the hot paths on fixed board fixtures")
+    parser.add_argument("-f", "--fixtures", choices=[f[0] for f in FIXTURES], nargs="+",
+                        default=[f[0] for f in FIXTURES], help="Fixtures to run")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Runs per case, the fastest one counts")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.5,
+                        help="Allowed slowdown against the baseline, 0.5 is 50%%")
+    parser.add_argument("--update", action="store_true",
+                        help="Write the results as the new baseline instead of comparing")
+    parser.add_argument("--write-fixtures", action="store_true",
+                        help="Generate the board fixtures again and exit")
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        write_fixtures()
+        print("fixtures written to", FIXTURE_DIR)
+        return
+
+    benchmarks = suite(args.fixtures)
+    results = {case: run_case(setup, run, args.repeat) for case, (setup, run) in benchmarks.items()}
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    if args.update:
+        for case, (elapsed, relative) in results.items():
+            baseline[case] = {"ms": round(elapsed * 1000, 4), "relative": round(relative, 4)}
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("baseline written to", BASELINE)
+
+    slower = []
+    for case, (elapsed, relative) in results.items():
+        line = f"{case}: {elapsed * 1000:.3f} ms"
+        if case in baseline and not args.update:
+            expected = baseline[case]["relative"]
+            # A single slow measurement is often noise, the fastest retry counts
+            for _ in range(RETRIES):
+                if relative <= expected * (1 + args.tolerance):
+                    break
+                retry = run_case(*benchmarks[case], args.repeat)
+                elapsed, relative = min((elapsed, relative), retry, key=lambda r: r[1])
+            ratio = relative / expected
+            line += f" ({ratio:.2f}x baseline)"
+            if ratio > 1 + args.tolerance and elapsed - baseline[case]["ms"] / 1000 > NOISE_FLOOR:
+                slower.append(case)
+                line += " SLOWER"
+        print(line)
+
+    if slower:
+        print(f"{len(slower)} cases slower than the baseline by more than {args.tolerance:.0%}:")
+        for case in slower:
+            print(" ", case)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,170 @@
+import cProfile
 import random
-import copy
+import time
+from array import array
+from collections import deque
+from collections.abc import Set
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from frontier import mine_probabilities
+from linear import linear_deductions
+from probe import ConstraintProber
+
+# Offsets of the 8 cells around a cell
+NEIGHBOR_OFFSETS = [(di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if (di, dj) != (0, 0)]
+
+class NeighborTable():
+    """
+    Neighbors of every cell of a height x width board, built once.
+    Cell k = i * width + j; its neighbor indices are
+    index[start[k]:start[k + 1]] (CSR layout), and cells[k] holds
+    the same neighbors as (i, j) tuples shared with coords.
+    """
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.coords = [(i, j) for i in range(height) for j in range(width)]
+        self.start = array("i", [0])
+        self.index = array("i")
+        for i, j in self.coords:
+            for di, dj in NEIGHBOR_OFFSETS:
+                if 0 <= i + di < height and 0 <= j + dj < width:
+                    self.index.append((i + di) * width + j + dj)
+            self.start.append(len(self.index))
+        coords = self.coords
+        start = self.start
+        self.cells = [tuple(coords[n] for n in self.index[start[k]:start[k + 1]])
+                      for k in range(height * width)]
+
+    def neighbors(self, cell):
+        # The (i, j) cells around cell, without bounds checks or new tuples
+        return self.cells[cell[0] * self.width + cell[1]]
+
+@lru_cache(maxsize=4)
+def neighbor_table(height, width):
+    # Shared by every game, AI and GUI of the same size.
+    # Only a few sizes are kept, a 1000 x 1000 table alone takes hundreds of MB
+    return NeighborTable(height, width)
+
+class LazyNeighbors():
+    """
+    Neighbors computed on every call, for boards too large for a
+    NeighborTable. Same neighbors(cell) interface.
+    """
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+
+    def neighbors(self, cell):
+        i, j = cell
+        return tuple((i + di, j + dj) for di, dj in NEIGHBOR_OFFSETS
+                     if 0 <= i + di < self.height and 0 <= j + dj < self.width)
+
+def flood_fill(cell, neighbors, nearby_mines):
+    """
+    Returns the cells revealed by clicking the safe cell, grown from it
+    on demand: the whole zero region with its numbered border, or the
+    cell alone if it has mines around it.
+    """
+    if nearby_mines(cell):
+        return {cell}
+    cells = {cell}
+    stack = [cell]
+    while stack:
+        for neighbor in neighbors.neighbors(stack.pop()):
+            if neighbor not in cells:
+                cells.add(neighbor)
+                if not nearby_mines(neighbor):
+                    stack.append(neighbor)
+    return cells
+
+def make_rng(seed):
+    # An int seed or a random.Random instance, None keeps using the random module
+    if seed is None:
+        return random
+    if isinstance(seed, random.Random):
+        return seed
+    return random.Random(seed)
+
+def splitmix64(x):
+    # Hash of a uint64 NumPy array, wrapping around like the C version
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def place_mines(keys, height, width, mines):
+    """
+    Returns a (len(keys), height * width) bool NumPy array, one board
+    per 64-bit key. The mines are the cells with the smallest hash of
+    (key, cell), so every board is reproducible from its key alone and
+    a whole batch is placed without a Python loop.
+    """
+    keys = np.asarray(keys, dtype=np.uint64).reshape(-1, 1)
+    boards = np.zeros((len(keys), height * width), dtype=bool)
+    if mines:
+        cells = np.arange(height * width, dtype=np.uint64)
+        scores = splitmix64(splitmix64(keys) + cells)
+        chosen = np.argpartition(scores, mines - 1, axis=1)[:, :mines]
+        np.put_along_axis(boards, chosen, True, axis=1)
+    return boards
+
+def neighbor_counts(board):
+    """
+    Returns the number of mines around every cell of a bool NumPy board,
+    the sum of the 8 shifted copies of the zero-padded board.
+    Leading axes are kept, so a (n, height, width) stack works too.
+    """
+    height, width = board.shape[-2:]
+    pad = [(0, 0)] * (board.ndim - 2) + [(1, 1), (1, 1)]
+    padded = np.pad(board, pad).astype(np.int8)
+    counts = np.zeros(board.shape, dtype=np.int8)
+    for di, dj in NEIGHBOR_OFFSETS:
+        counts += padded[..., 1 + di:1 + di + height, 1 + dj:1 + dj + width]
+    return counts
+
+class MineCells(Set):
+    """Read-only set of the (i, j) mine cells of a NumPy board"""
+    def __init__(self, board):
+        self.board = board
+        self.count = int(board.sum())
+
+    def __contains__(self, cell):
+        i, j = cell
+        return 0 <= i < self.board.shape[0] and 0 <= j < self.board.shape[1] and bool(self.board[i, j])
+
+    def __iter__(self):
+        rows, cols = np.nonzero(self.board)
+        return zip(rows.tolist(), cols.tolist())
+
+    def __len__(self):
+        return self.count
 
 class Minesweeper():
     """Minesweeper game representation"""
-    def __init__(self, height, width, mines):
+    def __init__(self, height, width, mines, use_numpy=False, seed=None):
 
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
         self.mines = set()
+        # board is a bool NumPy array instead of nested lists
+        self.use_numpy = use_numpy
+        # int seed or random.Random instance the board is generated from
+        self.seed = seed if isinstance(seed, int) else None
+        self.rng = make_rng(seed)
+        # NeighborTable of the board, built on first use: NumPy boards count
+        # with self.counts and flood from them, so they never need one
+        self.table = None
+
+        if use_numpy:
+            self.place_mines_numpy(mines)
+            return
 
         # Initialize an empty field with no mines
         self.board = []
@@ -20,8 +176,8 @@ class Minesweeper():
 
         # Add mines randomly
         while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
+            i = self.rng.randrange(height)
+            j = self.rng.randrange(width)
             if not self.board[i][j]:
                 self.mines.add((i, j))
                 self.board[i][j] = True
@@ -30,8 +186,52 @@ class Minesweeper():
         self.mines_found = set()
         self.ans_board = None
         self.init_board()
+
+    def place_mines_numpy(self, mines):
+        if np is None:
+            raise ImportError("Minesweeper(use_numpy=True) needs numpy installed")
+        # An int seed is the key itself, so MinesweeperEnv.reset([seed]) places the same mines.
+        # Negative and huge seeds wrap around to a uint64 key
+        key = self.seed % 2 ** 64 if self.seed is not None else self.rng.getrandbits(64)
+        self.board = place_mines([key], self.height, self.width, mines).reshape(self.height, self.width)
+        # Building a tuple per mine would cost more than the board itself
+        self.mines = MineCells(self.board)
+
+        self.mines_found = set()
+        self.ans_board = None
+        self.init_board()
+
+    @classmethod
+    def from_mines(cls, height, width, mine_cells, use_numpy=False):
+        """
+        Returns a game with the mines at the given (i, j) cells,
+        e.g. to replay a recorded board.
+        """
+        game = cls(height, width, 0, use_numpy=use_numpy)
+        for i, j in mine_cells:
+            game.board[i][j] = True
+        if use_numpy:
+            game.mines = MineCells(game.board)
+        else:
+            game.mines = {(i, j) for i, j in mine_cells}
+        game.init_board()
+        return game
         
+    @property
+    def neighbors(self):
+        if self.table is None:
+            self.table = neighbor_table(self.height, self.width)
+        return self.table
+
     def init_board(self):
+        # Zero regions of the board, found on the first reveal
+        self.region = None
+        self.regions = None
+        if self.use_numpy:
+            self.counts = neighbor_counts(self.board)
+            self.ans_board = np.where(self.board, -1, self.counts)
+            return
+
         ans_board = []
         for i in range(self.height):
             row = []
@@ -47,8 +247,72 @@ class Minesweeper():
                     ans_board[i][j] = -1
         self.ans_board = ans_board
 
+    def find_zero_regions(self):
+        """
+        Groups the zero cells of a list board into connected regions, each
+        with its numbered border, with an explicit stack instead of recursion.
+        self.region maps cell index i * width + j to its region
+        (-1 for cells that are not zero), self.regions holds the cells.
+        """
+        zero = [v == 0 for row in self.ans_board for v in row]
+        coords = self.neighbors.coords
+        start = self.neighbors.start
+        index = self.neighbors.index
+
+        region = [-1] * len(zero)
+        regions = []
+        for k, is_zero in enumerate(zero):
+            if not is_zero or region[k] != -1:
+                continue
+            n = len(regions)
+            region[k] = n
+            cells = set()
+            stack = [k]
+            while stack:
+                c = stack.pop()
+                cells.add(coords[c])
+                for m in index[start[c]:start[c + 1]]:
+                    if not zero[m]:
+                        # Border cell, revealed but not expanded
+                        cells.add(coords[m])
+                    elif region[m] == -1:
+                        region[m] = n
+                        stack.append(m)
+            regions.append(frozenset(cells))
+        self.region = region
+        self.regions = regions
+
+    def reveal(self, cell):
+        """
+        Returns the cells revealed by clicking the safe cell:
+        the whole region of a zero cell, or the cell alone.
+        NumPy boards flood from the cell instead of finding every region.
+        """
+        if self.use_numpy:
+            return flood_fill(cell, LazyNeighbors(self.height, self.width), self.nearby_mines)
+        if self.regions is None:
+            self.find_zero_regions()
+        n = self.region[cell[0] * self.width + cell[1]]
+        if n == -1:
+            return {cell}
+        return self.regions[n]
+
+    def safe_hint(self, rng=None, exclude=()):
+        """
+        Returns a random safe cell not in exclude,
+        the hints the player gets at the start of a game.
+        """
+        rng = rng or self.rng
+        while True:
+            i = rng.randrange(self.height)
+            j = rng.randrange(self.width)
+            if (i, j) not in exclude and not self.is_mine((i, j)):
+                return (i, j)
+
     def is_mine(self, cell):
         i, j = cell
+        if self.use_numpy:
+            return bool(self.board[i, j])
         return self.board[i][j]
 
     def nearby_mines(self, cell):
@@ -58,200 +322,362 @@ class Minesweeper():
         not including the cell itself.
         """
 
+        if self.use_numpy:
+            return int(self.counts[cell[0], cell[1]])
+
         # Keep count of nearby mines
         count = 0
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
+        board = self.board
+        for i, j in self.neighbors.neighbors(cell):
+            if board[i][j]:
+                count += 1
+
+        return count
+
+# Side of the square tiles of a ChunkedMinesweeper
+CHUNK = 32
+
+def find_all(data, value):
+    # Offsets of every byte of data equal to the signed byte value, the scan runs in C
+    byte = bytes([value & 0xFF])
+    k = data.find(byte)
+    while k != -1:
+        yield k
+        k = data.find(byte, k + 1)
+
+class ChunkedArray():
+    """
+    A signed byte per cell k = i * width + j, like array("b"), stored in
+    CHUNK x CHUNK tiles that are allocated on their first write.
+    Cells of the other tiles read as 0.
+    """
+    def __init__(self, width):
+        self.width = width
+        # (tile row, tile column) -> array of CHUNK * CHUNK values
+        self.chunks = {}
+
+    def __getitem__(self, k):
+        i, j = divmod(k, self.width)
+        chunk = self.chunks.get((i // CHUNK, j // CHUNK))
+        if chunk is None:
+            return 0
+        return chunk[i % CHUNK * CHUNK + j % CHUNK]
+
+    def __setitem__(self, k, value):
+        i, j = divmod(k, self.width)
+        chunk = self.chunks.get((i // CHUNK, j // CHUNK))
+        if chunk is None:
+            chunk = self.chunks[(i // CHUNK, j // CHUNK)] = array("b", bytes(CHUNK * CHUNK))
+        chunk[i % CHUNK * CHUNK + j % CHUNK] = value
+
+    def indices(self, value):
+        # Every cell k holding value (not 0), tile by tile
+        for (ci, cj), chunk in self.chunks.items():
+            for n in find_all(chunk.tobytes(), value):
+                yield (ci * CHUNK + n // CHUNK) * self.width + cj * CHUNK + n % CHUNK
+
+class ChunkedMines():
+    """The mines of a ChunkedMinesweeper: their number and membership, without listing them"""
+    def __init__(self, game):
+        self.game = game
+
+    def __contains__(self, cell):
+        return self.game.is_mine(cell)
+
+    def __len__(self):
+        return self.game.total_mines
+
+class ChunkedMinesweeper():
+    """
+    A game on a board too large to allocate, e.g. 100000 x 100000.
+    The mines of each CHUNK x CHUNK tile are placed from (seed, tile row,
+    tile column) alone when a cell of the tile is first looked at, so
+    memory follows the explored area and every tile is the same
+    whichever order it is reached in. Each tile holds round(density * cells)
+    mines, so the total is known without placing them all.
+    """
+    def __init__(self, height, width, density, seed=0):
+        self.height = height
+        self.width = width
+        self.density = density
+        self.seed = seed
+        self.use_numpy = False
+        self.rng = make_rng(seed)
+        self.neighbors = LazyNeighbors(height, width)
+        # (tile row, tile column) -> bytearray, 1 for the mines of the tile
+        self.chunks = {}
+
+        # Tiles of the last row and column are cut by the board edges
+        self.total_mines = 0
+        for rows, tile_rows in self.tile_sizes(height):
+            for cols, tile_cols in self.tile_sizes(width):
+                self.total_mines += round(density * rows * cols) * tile_rows * tile_cols
+        self.mines = ChunkedMines(self)
+
+    @staticmethod
+    def tile_sizes(length):
+        # (cells per tile, number of tiles) along one side of the board
+        sizes = [(CHUNK, length // CHUNK)]
+        if length % CHUNK:
+            sizes.append((length % CHUNK, 1))
+        return sizes
 
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
+    def chunk(self, ci, cj):
+        tile = self.chunks.get((ci, cj))
+        if tile is None:
+            rows = min(CHUNK, self.height - ci * CHUNK)
+            cols = min(CHUNK, self.width - cj * CHUNK)
+            rng = random.Random(f"{self.seed}/{ci}/{cj}")
+            tile = bytearray(CHUNK * CHUNK)
+            for n in rng.sample(range(rows * cols), round(self.density * rows * cols)):
+                tile[n // cols * CHUNK + n % cols] = 1
+            self.chunks[(ci, cj)] = tile
+        return tile
 
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+    def is_mine(self, cell):
+        i, j = cell
+        return self.chunk(i // CHUNK, j // CHUNK)[i % CHUNK * CHUNK + j % CHUNK] == 1
 
+    def nearby_mines(self, cell):
+        count = 0
+        for neighbor in self.neighbors.neighbors(cell):
+            if self.is_mine(neighbor):
+                count += 1
         return count
-class Sentence():
-    def __init__(self, cells):
-        # cells are the mine candidate
-        # count is the number of mine
-        self.cells = set(cells) # m unmarked cells
-        # cell = (y, x, 1 or -1)
-
-    def __eq__(self, other):
-        # when cells and count are equal
-        return self.cells == other.cells
-    
+
+    def reveal(self, cell):
+        # Same as Minesweeper.reveal, the region is flooded on demand
+        return flood_fill(cell, self.neighbors, self.nearby_mines)
+
+    def safe_hint(self, rng=None, exclude=()):
+        rng = rng or self.rng
+        while True:
+            cell = (rng.randrange(self.height), rng.randrange(self.width))
+            if cell not in exclude and not self.is_mine(cell):
+                return cell
+
+class UnexploredCells():
+    """
+    The cells of a chunked board that are not explored, known or next to
+    a revealed cell, too many to list: counted, and sampled on demand.
+    """
+    def __init__(self, height, width, touched):
+        self.height = height
+        self.width = width
+        self.touched = touched
+
+    def __len__(self):
+        return self.height * self.width - len(self.touched)
+
+    def sample(self, rng):
+        while True:
+            cell = (rng.randrange(self.height), rng.randrange(self.width))
+            if cell not in self.touched:
+                return cell
+
+class Constraint():
+    """
+    Exactly count of the cells k (i * width + j) are mines.
+    One per revealed cell, instead of its C(m, m-n+1) + C(m, n+1) clauses.
+    """
+    __slots__ = ("cells", "count")
+
+    def __init__(self, cells, count):
+        self.cells = set(cells)
+        self.count = count
+
     def __len__(self):
         return len(self.cells)
 
-    def be_not(self):
-        new_cells = set()
-        target_cells = self.cells.copy()
-        for c in target_cells:
-            new_c = (c[0], c[1], -c[2])
-            new_cells.add(new_c)
-        return new_cells
-    
-    def matching_sentence(self, other, target):
-        # target in other, -target in self
-        self_cells = self.cells.copy()
-        other_cells = other.cells.copy()
-
-        other_cells.remove(target)
-        n_target = (target[0], target[1], -target[2])
-        self_cells.remove(n_target)
-        new_cells = (other_cells | self_cells)
-        s = Sentence(new_cells)
-        return s
+    def known_mines(self):
+        if self.count == len(self.cells):
+            return set(self.cells)
+        return set()
+
+    def known_safes(self):
+        if self.count == 0:
+            return set(self.cells)
+        return set()
+
+    def subtract(self, other):
+        # other cells is self cells' subset
+        return Constraint(self.cells - other.cells, self.count - other.count)
+
+# Methods counted and timed by MinesweeperAI(stats=True)
+TIMED_METHODS = ("add_knowledge", "expand", "init_neighbors", "resolve_constraints",
+                 "check_constraint", "check_overlaps", "check_global")
 
 class MinesweeperAI():
-    def __init__(self, height, width, game):
+    def __init__(self, height, width, game, seed=None, stats=False, profile=False,
+                 linear=False, probing=False):
         # Set initial height and width
         self.height = height
         self.width = width
         self.game = game
+        # The game's cached table on list boards, NumPy and chunked boards
+        # can be too large to build one
+        self.neighbors = LazyNeighbors(height, width) if game.use_numpy else game.neighbors
+        # Per-cell state is kept in tiles that are allocated as they are explored
+        self.chunked = isinstance(game, ChunkedMinesweeper)
+        # int seed or random.Random instance for the random moves
+        self.rng = make_rng(seed)
+        # Every move in order, for replay files:
+        # ("user" | "random" | "guess", i, j) and ("add_knowledge",) per call.
+        # Deduced cells are not logged, replays derive them again
+        self.moves = []
         # Using set() to save (not repeating)
 
         self.pos_set = set()
 
-        # Keep track of cells known to be safe or mines
-        # positive clauses 
-        self.mines = set()
-        # negative clauses
-        self.safes = set()
+        # Cell k (i * width + j) -> 1 mine, -1 safe, 0 unknown.
+        # The only per-cell record of what is known, see mines and safes
+        self.cell_state = ChunkedArray(width) if self.chunked else array("b", bytes(height * width))
+        # Cells (i, j, 1 or -1) marked since they were last expanded, the last one first
+        self.queue = []
+        # Mine count constraints around the revealed cells.
+        # dicts are used as ordered sets, so replays do not depend on id()
+        self.constraints = {}
+        # Cell k -> constraints containing the cell
+        self.cell_constraints = {}
+        # Constraints added or changed since they were last checked
+        self.pending_constraints = deque()
+        # Constraints the count rules could not resolve, compared with their overlaps next
+        self.overlap_constraints = deque()
+        # Number of cells known to be mines or safe
+        self.mine_count = 0
+        self.safe_count = 0
+        # Largest KB size seen during add_knowledge
+        self.peak_kb = 0
 
-        # List of Sentences about the game known to be true
-        self.knowledge = []
-        self.knowledge0 = []
+        # Row-reduce the constraints with NumPy at every fixed point of the propagation
+        if linear and np is None:
+            raise ImportError("MinesweeperAI(linear=True) needs numpy installed")
+        self.linear = linear
+        # Failed-literal probing of the constraints at every fixed point
+        self.probing = probing
+        # The constraints changed since the last check_global
+        self.constraints_dirty = False
 
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(0)
-            self.board.append(row)
+        # Counters and timers of the hot methods, None when disabled.
+        # The timed methods are only wrapped when enabled, so there is no cost otherwise
+        self.stats = None
+        if stats:
+            self.stats = {"functions": {}, "passes": 0, "kb_size": []}
+            for name in TIMED_METHODS:
+                setattr(self, name, self.timed(name, getattr(self, name)))
+        # cProfile of every add_knowledge call and deductions pass, see dump_profile
+        self.profiler = cProfile.Profile() if profile else None
+        # Cells proven while deductions() runs and not yielded yet,
+        # a caller that stops iterating gets them first on its next call
+        self.found = deque()
+        self.collecting = False
+        # Set by cancel(), the running add_knowledge or deductions call
+        # stops after its current pass and clears it
+        self.cancelled = False
+        # Every change to the cells and constraints since the first
+        # checkpoint(), in order, None until then so nothing is recorded
+        self.trail = None
+        # (trail length, moves length, queues, constraints_dirty, found) per checkpoint
+        self.checkpoints = []
+
+    def timed(self, name, method):
+        counter = self.stats["functions"].setdefault(name, {"calls": 0, "time": 0.0})
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                counter["calls"] += 1
+                counter["time"] += time.perf_counter() - start
+        return wrapper
+
+    def count_pass(self, kb_size):
+        # One cell or constraint processed by add_knowledge
+        self.peak_kb = max(self.peak_kb, kb_size)
+        if self.stats is not None:
+            self.stats["passes"] += 1
+            self.stats["kb_size"].append(kb_size)
+
+    def get_stats(self):
+        """
+        Returns the calls and cumulative time of TIMED_METHODS and deductions,
+        the number of propagation passes and the KB size after each of them.
+        Empty if the AI was built without stats=True.
+        """
+        if self.stats is None:
+            return {}
+        return {
+            "functions": {name: dict(counter) for name, counter in self.stats["functions"].items()},
+            "passes": self.stats["passes"],
+            "kb_size": list(self.stats["kb_size"]),
+            "peak_kb": self.peak_kb,
+        }
+
+    def dump_profile(self, path):
+        # pstats file of the add_knowledge calls and deductions passes, e.g. for snakeviz or flameprof
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
 
     def mark_board(self, board, say=""):
-        mark_board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(0)
-            mark_board.append(row)
-        for sentence in self.knowledge0:
-            for c in sentence.cells:
-                i, j, v = c
-                if board[i][j] and v:
-                    mark_board[i][j] = 1
-                elif not board[i][j] and v == -1:
-                    mark_board[i][j] = -1
-                # check the mark 
-                else:
-                    print("in the check:", say)
-                    print("Error board")
-                    print((i, j), mark_board[i][j], v)
-                    for s in self.mines:
-                        print(s)
-                    return False
+        # Checks every resolved cell against the board
+        for i, j, state in self.mines | self.safes:
+            if bool(board[i][j]) != (state == 1):
+                print("in the check:", say)
+                print("Error board")
+                print((i, j), state)
+                return False
         return True
 
-                
-    def mark_single_literal(self, sentence):
-        if len(sentence) != 1:
-            return 0
-        for cell in sentence.cells:
-            if sentence not in self.knowledge0:
-                self.knowledge0.append(sentence)
-                
-            if cell[2] == 1:
-                self.mines.add(cell)
-            else:
-                self.safes.add(cell)
+    def mark_cell(self, cell):
+        # Record the cell (i, j, 1 or -1) that just became known
+        self.cell_state[cell[0] * self.width + cell[1]] = cell[2]
+        if cell[2] == 1:
+            self.mine_count += 1
+        else:
+            self.safe_count += 1
+        if self.trail is not None:
+            self.trail.append(("cell", cell))
 
-            if sentence in self.knowledge:
-                self.knowledge.remove(sentence)
-    
-    def inserting(self, s1):
-        # About inserting a new clause to the KB:
-        for s in self.knowledge0:
-            self.unit_propagation(s)
-
-        if len(s1) == 1:
-            self.unit_propagation(s1)
-            self.knowledge.append(s1)
-            return 0
-        
-        if len(s1) < 1:
-            return 0
-        elif len(s1) > 1:
-            not_append = False
-            for s2 in self.knowledge:
-                if s1 is s2:
-                    not_append = True
-                    continue
-                elif s1 == s2:
-                    not_append = True
-                    continue
-                # s1 and s2 have same cells and count -> Duplicates
-                # s1 cells is s2 cells' subset -> Subsumption
-                elif s1.cells.issubset(s2.cells):
-                    if s1 not in self.knowledge:
-                        self.knowledge.remove(s2)
-
-                elif s2.cells.issubset(s1.cells):
-                    not_append = True
-            if not not_append:
-                self.knowledge.append(s1)
-        
-    def matching(self, s1):
-        # for s1 in self.knowledge:
-        for s2 in self.knowledge:
-            if s1 is s2:
-                continue
-            if s1 == s2:
-                continue
-            n_cells = s1.be_not()
-            target = n_cells & s2.cells
-            if len(target) == 1 and len(n_cells) == 2 and len(s2.cells) == 2:
-                for t in target:
-                    new_sentence = s1.matching_sentence(s2, t)
-                    self.inserting(new_sentence)
-                    
-    def unit_propagation(self, sentence):
-        # 4. Unit-propagation heuristic:
-        if len(sentence) != 1:
-            return 0
-        for single_literal in sentence.cells:
-            n_single_literal = (single_literal[0], single_literal[1], -single_literal[2])
-            for multi_literal in self.knowledge:
-                # For each multi-literal clause containing A:
-                # If the two occurrences of A are both positive or both negative:
-                if len(multi_literal) > 1 and single_literal in multi_literal.cells:
-                    self.knowledge.remove(multi_literal)
-                    
-                # Else: Remove A from the multi-literal clause. This is the result of resolution.
-                elif len(multi_literal) > 1 and n_single_literal in multi_literal.cells:
-                    self.knowledge.remove(multi_literal)
-                    new_multi_literal = multi_literal.cells
-                    new_multi_literal.remove(n_single_literal)
-                    self.inserting(Sentence(new_multi_literal))
-        
-    def init_knowledge(self, pos=None):
-        if pos is None:
-            pos = self.make_random_move()
+    def known_cells(self, state):
+        # Every cell (i, j, state) marked with state, read back from cell_state
+        if self.chunked:
+            indices = self.cell_state.indices(state)
         else:
-            print("user move:", pos)
+            indices = find_all(self.cell_state.tobytes(), state)
+        width = self.width
+        return {(k // width, k % width, state) for k in indices}
+
+    @property
+    def mines(self):
+        # Cells (i, j, 1) known to be mines, a new set on every access
+        return self.known_cells(1)
+
+    @property
+    def safes(self):
+        # Cells (i, j, -1) known to be safe, a new set on every access
+        return self.known_cells(-1)
+
+    def kb_size(self):
+        return len(self.queue) + len(self.constraints)
+
+    def is_known(self, cell):
+        # The (i, j) or (i, j, 1 or -1) cell is already marked as mine or safe
+        return self.cell_state[cell[0] * self.width + cell[1]] != 0
+
+    def init_knowledge(self, pos=None, source="user"):
+        # Without pos the game hands out a random safe cell as a hint.
+        # source is only recorded in moves, e.g. "random" when replaying one
+        if pos is None:
+            pos = self.game.safe_hint(self.rng, self.pos_set)
+            source = "random"
         if pos in self.pos_set:
             return 0
         self.pos_set.add(pos)
-        cell_set = set()
-        cell_set.add((pos[0], pos[1], -1))
-        self.knowledge.append(Sentence(cell_set))
-        self.board[pos[0]][pos[1]] = -1
+        if self.trail is not None:
+            self.trail.append(("pos", pos))
+        self.moves.append((source, pos[0], pos[1]))
+        self.mark_cells([pos[0] * self.width + pos[1]], -1)
         return pos
     
     def get_nearby_mines(self, pos):
@@ -262,134 +688,363 @@ class MinesweeperAI():
         cells = set()
         n = self.get_nearby_mines(pos)
         # n = self.game.ans_board[pos[0]][pos[1]]
-        # Loop over all cells within one row and column
-        for i in range(pos[0] - 1, pos[0] + 2):
-            for j in range(pos[1] - 1, pos[1] + 2):
-                # Ignore the cell itself
-                # Add to the cell collection if the cell is not yet explored
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    # not yet explored & not mine & not safe
-                    if (i, j) not in self.pos_set and (i, j, 1) not in self.mines and (i, j, -1) not in self.safes:
-                        cells.add((i, j, -1))
-                    if (i, j, 1) in self.mines:
-                        n -= 1
-        i, j = pos
-        if self.game.board[i][j]:
+        for cell in self.neighbors.neighbors(pos):
+            # Add to the cell collection if the cell is not yet explored
+            k = cell[0] * self.width + cell[1]
+            state = self.cell_state[k]
+            # not yet explored & not mine & not safe
+            if cell not in self.pos_set and state == 0:
+                cells.add(k)
+            if state == 1:
+                n -= 1
+        if self.game.is_mine(pos):
             print("ERROR it is not safe")
-        # Initiation
-        m = len(cells)
-        cells_list = list(cells)
-        
-        # all mines
-        if m == 0:
-            return 0
-        if m == n:
-            for c in cells:
-                cell_set = set()
-                cell_set.add((c[0], c[1], 1))
-                self.inserting(Sentence(cell_set))
-                self.mines.add((c[0], c[1], 1))
-            if not self.mark_board(self.game.board, "in m==n"):
-                return 0
-        # all safe
-        elif n == 0:
-            for c in cells:
-                cell_set = set()
-                cell_set.add((c[0], c[1], -1))
-                self.inserting(Sentence(cell_set))
-                self.safes.add((c[0], c[1], -1))
-                
-            if not self.mark_board(self.game.board, say="in n==0"):
-                print("KB", len(self.knowledge), len(self.knowledge0))
-                return 0
-        # unsure
-        else: # m > n > 0
-            # C(m, m-n+1)
-            for i in range(m):
-                s = set()
-                for j in range(i, min(m-n+1+m, m)):
-                    c = cells_list[j]
-                    s.add((c[0], c[1], 1))
-                # self.knowledge.append(Sentence(s))
-                if len(s) == m-n+1:
-                    self.inserting(Sentence(s))
-                
-            if not self.mark_board(self.game.board, say="C(m, m-n+1)"):
-                print("KB", len(self.knowledge), len(self.knowledge0))
-                return 0
-            
-            # C(m, n+1) clauses, each having n+1 negative literals.
-            for i in range(m):
-                s = set()
-                for j in range(i, min(n+1+m, m)):
-                    c = cells_list[j]
-                    s.add((c[0], c[1], -1))
-                # self.knowledge.append(Sentence(s))
-                if len(s) == n+1:
-                    self.inserting(Sentence(s))
-                
-            if not self.mark_board(self.game.board, say="C(m, n+1)"):
-                print("KB", len(self.knowledge), len(self.knowledge0))
-                return 0
-    
-    def check_state(self, old_kb):
-        if len(self.knowledge) == 0 and len(self.mines) == len(self.game.mines):
-            return False
-        elif len(self.knowledge) == 0:
+        # Exactly n of the unknown neighbors are mines
+        self.add_constraint(Constraint(cells, n))
+
+    def add_constraint(self, constraint):
+        if not constraint.cells:
+            return
+        self.link(constraint)
+        self.pending_constraints.append(constraint)
+        self.constraints_dirty = True
+        if self.trail is not None:
+            self.trail.append(("add", constraint))
+
+    def remove_constraint(self, constraint):
+        if constraint not in self.constraints:
+            return
+        self.unlink(constraint)
+        if self.trail is not None:
+            self.trail.append(("remove", constraint))
+
+    def link(self, constraint):
+        # Indexes the constraint by its cells, without queueing it
+        self.constraints[constraint] = None
+        for cell in constraint.cells:
+            self.cell_constraints.setdefault(cell, {})[constraint] = None
+
+    def unlink(self, constraint):
+        del self.constraints[constraint]
+        for cell in constraint.cells:
+            constraints = self.cell_constraints[cell]
+            constraints.pop(constraint, None)
+            if not constraints:
+                del self.cell_constraints[cell]
+
+    def resolve_constraints(self, c):
+        # Cell c (i, j, 1 or -1) is known now, take it out of its constraints
+        k = c[0] * self.width + c[1]
+        for constraint in self.cell_constraints.pop(k, ()):
+            constraint.cells.discard(k)
+            if c[2] == 1:
+                constraint.count -= 1
+            self.pending_constraints.append(constraint)
+            self.constraints_dirty = True
+            if self.trail is not None:
+                self.trail.append(("resolve", constraint, c))
+
+    def mark_cells(self, cells, sign):
+        # Marks the cells k not known yet and queues them to be expanded
+        width = self.width
+        for k in cells:
+            if not self.cell_state[k]:
+                cell = (k // width, k % width, sign)
+                self.mark_cell(cell)
+                self.queue.append(cell)
+
+    def check_constraint(self, a):
+        # Deductions from constraint a alone, it is compared with its overlaps later
+        if a not in self.constraints:
+            return
+        mines = a.known_mines()
+        safes = a.known_safes()
+        if not a.cells or mines or safes:
+            self.remove_constraint(a)
+            self.mark_cells(mines, 1)
+            self.mark_cells(safes, -1)
+            return
+        self.overlap_constraints.append(a)
+
+    def check_overlaps(self, a):
+        # Deductions from constraint a with the constraints overlapping it
+        if a not in self.constraints:
+            return
+        overlapping = {}
+        for cell in a.cells:
+            overlapping.update(self.cell_constraints[cell])
+        for b in overlapping:
+            if b is a or b not in self.constraints:
+                continue
+            # Same cells -> Duplicates
+            if a.cells == b.cells:
+                self.remove_constraint(b)
+            # a cells is b cells' subset -> b minus a is a constraint too
+            elif a.cells < b.cells:
+                self.remove_constraint(b)
+                self.add_constraint(b.subtract(a))
+            elif b.cells < a.cells:
+                self.remove_constraint(a)
+                self.add_constraint(a.subtract(b))
+                return
+            # Difference: the cells only in b hold at least b.count - a.count mines
+            else:
+                only_a = a.cells - b.cells
+                only_b = b.cells - a.cells
+                if b.count - a.count == len(only_b):
+                    self.mark_cells(only_b, 1)
+                    self.mark_cells(only_a, -1)
+                elif a.count - b.count == len(only_a):
+                    self.mark_cells(only_a, 1)
+                    self.mark_cells(only_b, -1)
+
+    def check_global(self):
+        """
+        Deductions from all constraints together: row reduction, then
+        failed-literal probing if it proved nothing. Returns False if the
+        constraints did not change since the last call or nothing was proven.
+        """
+        if not self.constraints_dirty or not (self.linear or self.probing):
             return False
-        elif old_kb == self.knowledge:
+        self.constraints_dirty = False
+        constraints = [(c.cells, c.count) for c in self.constraints]
+        mines, safes = [], []
+        if self.linear:
+            mines, safes = linear_deductions(constraints)
+        if self.probing and not mines and not safes:
+            mines, safes = ConstraintProber(constraints).failed_literals()
+        self.mark_cells(mines, 1)
+        self.mark_cells(safes, -1)
+        return bool(mines or safes)
+
+    def has_work(self):
+        # Something is queued for add_knowledge, e.g. left by a deadline
+        if self.queue or self.pending_constraints or self.overlap_constraints:
+            return True
+        return self.constraints_dirty and (self.linear or self.probing)
+
+    def out_of_time(self, deadline):
+        # Checked after every pass, so a call always makes progress
+        return self.cancelled or (deadline is not None and time.perf_counter() > deadline)
+
+    def checkpoint(self):
+        """
+        Saves the point the next undo() goes back to. From the first
+        checkpoint on, the changes are recorded on the trail, so undo costs
+        what changed since instead of replaying the game.
+        """
+        if self.trail is None:
+            self.trail = []
+        self.checkpoints.append((len(self.trail), len(self.moves), list(self.queue),
+                                 deque(self.pending_constraints), deque(self.overlap_constraints),
+                                 self.constraints_dirty, deque(self.found)))
+
+    def undo(self):
+        # Pops the trail back to the last checkpoint, which is dropped
+        mark, moves, queue, pending, overlap, dirty, found = self.checkpoints.pop()
+        while len(self.trail) > mark:
+            change = self.trail.pop()
+            if change[0] == "cell":
+                cell = change[1]
+                self.cell_state[cell[0] * self.width + cell[1]] = 0
+                if cell[2] == 1:
+                    self.mine_count -= 1
+                else:
+                    self.safe_count -= 1
+            elif change[0] == "pos":
+                self.pos_set.discard(change[1])
+            elif change[0] == "add":
+                self.unlink(change[1])
+            elif change[0] == "remove":
+                self.link(change[1])
+            else:
+                _, constraint, c = change
+                k = c[0] * self.width + c[1]
+                constraint.cells.add(k)
+                if c[2] == 1:
+                    constraint.count += 1
+                self.cell_constraints.setdefault(k, {})[constraint] = None
+        del self.moves[moves:]
+        self.queue = queue
+        self.pending_constraints = pending
+        self.overlap_constraints = overlap
+        self.constraints_dirty = dirty
+        self.found = found
+
+    def cancel(self):
+        # Stops the running add_knowledge or deductions call, possibly on another thread
+        self.cancelled = True
+
+    def expand(self, c):
+        # The revealed cells queued by init_knowledge were not proven
+        if self.collecting and c[:2] not in self.pos_set:
+            self.found.append(c)
+        # Reveal the cell that just became known safe
+        if c[2] == -1:
+            self.init_neighbors(c[:2])
+        self.resolve_constraints(c)
+
+    def add_knowledge(self, deadline=None, max_passes=None):
+        """
+        Propagates to a fixed point, cheapest rules first (see step).
+        Stops after max_passes passes, or between passes once
+        time.perf_counter() is past deadline or when cancelled, but not
+        before the first pass. The work left stays
+        queued, so the next call resumes it. Returns True if the fixed
+        point was reached. An early stop is logged with its number of
+        passes, so replays stop at the same point.
+        """
+        n = len(self.moves)
+        self.moves.append(("add_knowledge",))
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            passes = 0
+            while max_passes is None or passes < max_passes:
+                if not self.step():
+                    return True
+                passes += 1
+                if self.out_of_time(deadline):
+                    break
+            self.moves[n] = ("add_knowledge", passes)
             return False
+        finally:
+            self.cancelled = False
+            if self.profiler is not None:
+                self.profiler.disable()
+
+    def deductions(self, deadline=None, max_passes=None):
+        """
+        Yields every cell (i, j, 1 or -1) proven by propagation as soon as
+        the pass that proved it is done, instead of at the fixed point.
+        The cells revealed by init_knowledge are not yielded.
+        deadline and max_passes stop it like add_knowledge. The work left
+        stays queued in the AI, so a later deductions() or add_knowledge()
+        call resumes where iteration stopped, and a later deductions()
+        call yields the cells proven but not yielded first.
+        With stats or profile, only the passes are timed and profiled,
+        not the caller's work between the cells.
+        """
+        n = len(self.moves)
+        self.moves.append(("add_knowledge",))
+        counter = None
+        if self.stats is not None:
+            counter = self.stats["functions"].setdefault("deductions", {"calls": 0, "time": 0.0})
+            counter["calls"] += 1
+        found = self.found
+        self.collecting = True
+        passes = 0
+        done = False
+        try:
+            while found:
+                yield found.popleft()
+            while max_passes is None or passes < max_passes:
+                if not self.measured_step(counter):
+                    done = True
+                    return
+                passes += 1
+                while found:
+                    yield found.popleft()
+                if self.out_of_time(deadline):
+                    break
+        finally:
+            self.collecting = False
+            self.cancelled = False
+            # Out of budget or closed by the caller, replays stop after the same pass
+            if not done:
+                self.moves[n] = ("add_knowledge", passes)
+
+    def measured_step(self, counter):
+        # step() added to the time of counter and to the profile, if enabled
+        start = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            return self.step()
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+            if counter is not None:
+                counter["time"] += time.perf_counter() - start
+
+    def step_constraints(self):
+        """
+        One pass of the constraint tiers, each only once the ones before
+        it are done: the count rules of a changed constraint, then its
+        overlaps with the others, then the global stage.
+        Returns False when none of them has work.
+        """
+        if self.pending_constraints:
+            self.check_constraint(self.pending_constraints.popleft())
+        elif self.overlap_constraints:
+            self.check_overlaps(self.overlap_constraints.popleft())
+        else:
+            return self.check_global()
         return True
-            
-    def add_knowledge(self):
-        copy_knowledge = []
-        loop = True
-        while(loop):
-            copy_knowledge = copy.deepcopy(self.knowledge)
-            for k in copy_knowledge:
-                # If there is a single-lateral clause in the KB:
-                if len(k) < 1:
-                    continue
-                elif len(k) == 1:
-                    # Mark that cell as safe or mined.
-                    # Move that clause to KB0.
-                    self.mark_single_literal(k)
-                    self.unit_propagation(k)
-                    # if not self.mark_board(self.game.board, "after unit_pro"):
-                    #     print("STEP2 ERROR", k.cells)
-                    #     return 0
-
-                    for c in k.cells:
-                        if c[2] == -1:
-                            self.init_neighbors(c[:2])
-                    # if not self.mark_board(self.game.board, "after neighbor"):
-                    #     return 0
-                else:
-                    self.matching(k)
-                    # if not self.mark_board(self.game.board, "after matching"):
-                    #     print("matching ERROR", k.cells)
-                    #     print("KB", len(self.knowledge), len(self.knowledge0))
-                    #     return 0
-            loop = self.check_state(copy_knowledge)
-        return 0
-    
-            
-            
+
+    def step(self):
+        # Expands one marked cell or runs one constraint tier, returns False when there is nothing left
+        if not self.queue and not self.pending_constraints and not self.overlap_constraints:
+            return self.check_global()
+        self.count_pass(self.kb_size())
+        # Constraints only once the marked cells are expanded
+        if not self.queue:
+            return self.step_constraints()
+        self.expand(self.queue.pop())
+        return True
+
+    def solved(self):
+        # Every mine found, or every safe cell known (the rest must be mines)
+        total_mines = len(self.game.mines)
+        return self.mine_count == total_mines or self.safe_count == self.height * self.width - total_mines
+
+    def mine_probabilities(self):
+        """
+        Returns ({(i, j): probability}, other_probability, other_cells):
+        the mine probability of every unknown cell in a constraint, and of
+        each unknown cell next to no revealed cell. other_cells is an
+        UnexploredCells on chunked boards.
+        """
+        if self.chunked:
+            touched = self.pos_set | {divmod(k, self.width) for k in self.cell_constraints} | {c[:2] for c in self.mines | self.safes}
+            other_cells = UnexploredCells(self.height, self.width, touched)
+        else:
+            other_cells = []
+            for i in range(self.height):
+                for j in range(self.width):
+                    if (i, j) not in self.pos_set and i * self.width + j not in self.cell_constraints and not self.is_known((i, j, 1)):
+                        other_cells.append((i, j))
+        # The total number of mines is known to the player, not where they are
+        mines_left = len(self.game.mines) - self.mine_count
+        constraints = [(c.cells, c.count) for c in self.constraints]
+        probabilities, other = mine_probabilities(constraints, len(other_cells), mines_left, independent=self.chunked)
+        probabilities = {divmod(k, self.width): p for k, p in probabilities.items()}
+        return probabilities, other, other_cells
+
     def make_random_move(self):
-        # safe set is NULL -> random choose (avoid the ensure mine cells)
         """
-        Returns a move to make on the Minesweeper board.
-        Should choose randomly among cells that:
-            1) have not already been chosen, and
-            2) are not known to be mines
+        Returns the unexplored cell least likely to be a mine when the
+        KB can make no more progress, or None if no cell is left.
+        The frontier is split into independent components whose mine
+        configurations are counted exactly, then combined with the
+        number of mines left; the game's mines are never looked at.
         """
-        # # if no move can be made
-        # if len(self.mines) + len(self.moves_made) == self.height * self.width:
-        #     return None
+        probabilities, other, other_cells = self.mine_probabilities()
+        candidates = [(p, cell) for cell, p in probabilities.items() if not self.is_known((cell[0], cell[1], 1))]
+        if other_cells:
+            candidates.append((other, None))
+        if not candidates:
+            return None
 
-        # loop until an appropriate move is found
-        while True:
-            i = random.randrange(self.game.height)
-            j = random.randrange(self.game.width)
-            if (i, j) not in self.pos_set and (i, j) not in self.game.mines:
-                return (i, j)
+        # Ties are broken randomly, like the moves were before
+        best = min(p for p, _ in candidates)
+        # Every cell left is a mine
+        if best >= 1:
+            return None
+        cells = sorted(cell for p, cell in candidates if p - best < 1e-12 and cell is not None)
+        if any(p - best < 1e-12 and cell is None for p, cell in candidates):
+            if self.chunked:
+                cells.append(other_cells.sample(self.rng))
+            else:
+                cells += other_cells
+        return self.rng.choice(cells)
@@ -0,0 +1,133 @@
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmark import PRESETS, positive_nonzero_int
+from minesweeper import *
+
+# Mines moved on one board before placing them all again
+MAX_REPAIRS = 100
+# Propagation passes allowed per solve, the board is dropped past them
+MAX_PASSES = 200000
+
+
+def place_around(rng, height, width, mines, first):
+    # Random mines, none on or around the first click so that it opens a region
+    table = neighbor_table(height, width)
+    excluded = {first, *table.neighbors(first)}
+    cells = [c for c in table.coords if c not in excluded]
+    return set(rng.sample(cells, mines))
+
+
+def solve(height, width, mine_cells, first):
+    """
+    Plays the board from the first click by deduction alone.
+    Returns the AI at its fixed point, or None when MAX_PASSES ran out.
+    """
+    game = Minesweeper.from_mines(height, width, mine_cells)
+    ai = MinesweeperAI(height=height, width=width, game=game)
+    ai.init_knowledge(first)
+    for _ in range(MAX_PASSES):
+        if not ai.step():
+            return ai
+    return None
+
+
+def attempt(height, width, mines, seed, first=None, repair=True):
+    """
+    Builds one board from seed: random mines around a safe first click,
+    then, while the AI gets stuck, one mine of the frontier it could not
+    resolve is moved to an unexplored cell (at most MAX_REPAIRS times).
+    Returns (mine cells, first, repairs) of a board solvable without
+    guessing, or None.
+    """
+    rng = random.Random(seed)
+    if first is None:
+        first = (rng.randrange(height), rng.randrange(width))
+    mine_cells = place_around(rng, height, width, mines, first)
+    table = neighbor_table(height, width)
+
+    for repairs in range(MAX_REPAIRS + 1):
+        ai = solve(height, width, mine_cells, first)
+        if ai is None:
+            return None
+        if ai.solved():
+            return sorted(mine_cells), first, repairs
+        if not repair:
+            return None
+        # Mines next to the revealed cells, and free cells beyond them
+        frontier = [c for c in (divmod(k, width) for k in ai.cell_constraints) if c in mine_cells]
+        interior = [c for c in table.coords
+                    if c[0] * width + c[1] not in ai.cell_constraints and c not in mine_cells
+                    and not ai.is_known((c[0], c[1], 1))]
+        if not frontier or not interior:
+            return None
+        mine_cells.remove(rng.choice(frontier))
+        mine_cells.add(rng.choice(interior))
+    return None
+
+
+def generate(height, width, mines, seed=None, first=None, repair=True, workers=1, max_attempts=1000):
+    """
+    Returns (game, first): a board that the AI solves from the safe
+    first click without guessing, and that click.
+    Attempt k uses seed + k and the first solvable attempt is kept,
+    so the board only depends on the seed, not on the number of workers.
+    """
+    if mines > height * width - 9:
+        raise ValueError("too many mines to keep the first click clear")
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    def found(result):
+        cells, first, _ = result
+        return Minesweeper.from_mines(height, width, cells), first
+
+    if workers == 1:
+        for k in range(max_attempts):
+            result = attempt(height, width, mines, seed + k, first, repair)
+            if result is not None:
+                return found(result)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for k in range(0, max_attempts, workers):
+                batch = [pool.submit(attempt, height, width, mines, seed + n, first, repair)
+                         for n in range(k, min(k + workers, max_attempts))]
+                for future in batch:
+                    result = future.result()
+                    if result is not None:
+                        for rest in batch:
+                            rest.cancel()
+                        return found(result)
+    raise RuntimeError(f"no board without guessing found in {max_attempts} attempts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate boards solvable without guessing")
+    parser.add_argument("-p", "--preset", choices=sorted(PRESETS), default="expert",
+                        help="Board preset")
+    parser.add_argument("-n", "--boards", type=positive_nonzero_int, default=10,
+                        help="Number of boards to generate")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the first board, board k uses seed + k * max attempts")
+    parser.add_argument("-j", "--workers", type=positive_nonzero_int, default=1,
+                        help=f"Worker processes (this machine has {os.cpu_count()} cores)")
+    parser.add_argument("--no-repair", action="store_true",
+                        help="Place all mines again instead of moving the ones the AI is stuck on")
+    args = parser.parse_args()
+
+    h, w, m = PRESETS[args.preset]
+    times = []
+    for k in range(args.boards):
+        start = time.perf_counter()
+        game, first = generate(h, w, m, args.seed + k * 1000, repair=not args.no_repair,
+                               workers=args.workers)
+        times.append(time.perf_counter() - start)
+        print(f"board {k}: first click {first}, {times[-1] * 1000:.1f} ms")
+    print(f"{args.preset}: mean {sum(times) / len(times) * 1000:.1f} ms, slowest {max(times) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+class ConstraintProber():
+    """
+    Counting propagation over (cells, count) constraints with a trail of
+    the cells it assigned, so an assumption is undone in time proportional
+    to what it implied instead of copying the constraints.
+    """
+    def __init__(self, constraints):
+        # index -> cell, and back
+        self.cells = []
+        index = {}
+        # constraint -> indices of its cells, and its mine count
+        self.members = []
+        self.need = []
+        for cells, count in constraints:
+            members = []
+            for cell in cells:
+                if cell not in index:
+                    index[cell] = len(self.cells)
+                    self.cells.append(cell)
+                members.append(index[cell])
+            self.members.append(members)
+            self.need.append(count)
+        # cell -> indices of the constraints containing it
+        self.cell_constraints = [[] for _ in self.cells]
+        for c, members in enumerate(self.members):
+            for n in members:
+                self.cell_constraints[n].append(c)
+
+        # Mines assigned and cells left open in every constraint
+        self.have = [0] * len(self.members)
+        self.left = [len(members) for members in self.members]
+        # cell -> 1 mine, -1 safe, 0 open
+        self.value = [0] * len(self.cells)
+        # Assigned cells in order, undo pops them
+        self.trail = []
+        # Constraints to check since one of their cells was assigned
+        self.queue = list(range(len(self.members)))
+
+    def assign(self, n, value):
+        self.value[n] = value
+        self.trail.append(n)
+        for c in self.cell_constraints[n]:
+            self.left[c] -= 1
+            if value == 1:
+                self.have[c] += 1
+            self.queue.append(c)
+
+    def propagate(self):
+        # Fills constraints that are full or need all their open cells, False on a contradiction
+        while self.queue:
+            c = self.queue.pop()
+            need, have, left = self.need[c], self.have[c], self.left[c]
+            if have > need or have + left < need:
+                self.queue.clear()
+                return False
+            if left and (have == need or have + left == need):
+                value = -1 if have == need else 1
+                for n in self.members[c]:
+                    if self.value[n] == 0:
+                        self.assign(n, value)
+        return True
+
+    def undo(self, mark):
+        # Takes back every assignment after trail[:mark]
+        while len(self.trail) > mark:
+            n = self.trail.pop()
+            value = self.value[n]
+            self.value[n] = 0
+            for c in self.cell_constraints[n]:
+                self.left[c] += 1
+                if value == 1:
+                    self.have[c] -= 1
+
+    def failed_literals(self):
+        """
+        Assumes each open cell is a mine, then safe, and propagates.
+        An assumption that contradicts the constraints proves the opposite,
+        which is kept for the following probes. Passes repeat until one
+        proves nothing. Returns (mines, safes): every cell assigned
+        without an assumption, including what plain propagation finds.
+        """
+        if not self.propagate():
+            # The constraints contradict each other already
+            return [], []
+        changed = True
+        while changed:
+            changed = False
+            for n in range(len(self.cells)):
+                if self.value[n]:
+                    continue
+                for value in (1, -1):
+                    mark = len(self.trail)
+                    self.assign(n, value)
+                    failed = not self.propagate()
+                    self.undo(mark)
+                    if failed:
+                        self.assign(n, -value)
+                        if not self.propagate():
+                            return [], []
+                        changed = True
+                        break
+        mines = [self.cells[n] for n in self.trail if self.value[n] == 1]
+        safes = [self.cells[n] for n in self.trail if self.value[n] == -1]
+        return mines, safes
@@ -0,0 +1,131 @@
+import pygame
+
+# Colors
+BLACK = (0, 0, 0)
+GRAY = (180, 180, 180)
+WHITE = (255, 255, 255)
+YELLOW = (240, 230, 140)
+
+NUM_COLOR = [(0, 0, 255), (0, 128, 0), (255, 0, 0), (0, 0, 128),
+             (128, 0, 0), (0, 128, 128), (0, 0, 0), (128, 128, 128)]
+
+
+class BoardRenderer():
+    """
+    Draws the board of main.py, redrawing only the cells whose state
+    changed since the last frame. The numbers are rendered once and the
+    rects of the redrawn cells are returned for pygame.display.update.
+    """
+    def __init__(self, screen, game, origin, cell_size, font, flag, mine):
+        self.screen = screen
+        self.origin = origin
+        self.cell_size = cell_size
+        self.flag = flag
+        self.mine = mine
+
+        # (number, color) -> rendered surface
+        self.glyphs = {}
+        for n in range(1, 9):
+            for color in (NUM_COLOR[n - 1], GRAY, BLACK):
+                self.glyphs[(n, color)] = font.render(str(n), True, color)
+
+        self.reset(game)
+
+    def reset(self, game):
+        # A new game, every cell is drawn again on the next frame
+        self.game = game
+        self.height = game.height
+        self.width = game.width
+        self.invalidate()
+
+    def invalidate(self):
+        # Forget what is on screen, e.g. after it was cleared
+        self.drawn = {}
+        self.mode = None
+        self.revealed = set()
+        self.flags = set()
+        self.safes = set()
+
+    def cell_at(self, pos):
+        # Board cell under a screen position, or None
+        x = pos[0] - self.origin[0]
+        y = pos[1] - self.origin[1]
+        if x < 0 or y < 0:
+            return None
+        i = int(y // self.cell_size)
+        j = int(x // self.cell_size)
+        if i < self.height and j < self.width:
+            return (i, j)
+        return None
+
+    def cell_rect(self, cell):
+        return pygame.Rect(
+            self.origin[0] + cell[1] * self.cell_size,
+            self.origin[1] + cell[0] * self.cell_size,
+            self.cell_size, self.cell_size
+        )
+
+    def state(self, cell, revealed, flags, safes, lost, stuck):
+        # What the cell shows: (background, glyph), glyph is a surface key or None
+        mine = self.game.is_mine(cell)
+        if mine and lost:
+            return (GRAY, "mine")
+        elif cell in flags:
+            return (WHITE if cell in revealed else GRAY, "flag")
+        elif mine and stuck:
+            return (GRAY, "mine")
+        elif cell in revealed:
+            nearby = self.game.nearby_mines(cell)
+            return (WHITE, (nearby, NUM_COLOR[nearby - 1]) if nearby else None)
+        elif cell in safes:
+            nearby = self.game.nearby_mines(cell)
+            return (YELLOW, (nearby, GRAY) if nearby else None)
+        elif lost or stuck:
+            nearby = self.game.nearby_mines(cell)
+            return (GRAY, (nearby, BLACK) if nearby else None)
+        return (GRAY, None)
+
+    def draw_cell(self, cell, state):
+        background, glyph = state
+        rect = self.cell_rect(cell)
+        pygame.draw.rect(self.screen, background, rect)
+        pygame.draw.rect(self.screen, WHITE, rect, 3)
+        if glyph == "mine":
+            self.screen.blit(self.mine, rect)
+        elif glyph == "flag":
+            self.screen.blit(self.flag, rect)
+        elif glyph is not None:
+            # Clipped to the cell, a glyph larger than a small cell would
+            # spill onto neighbors that are not redrawn
+            surface = self.glyphs[glyph]
+            self.screen.set_clip(rect)
+            self.screen.blit(surface, surface.get_rect(center=rect.center))
+            self.screen.set_clip(None)
+        return rect
+
+    def draw(self, revealed, flags, safes, lost, stuck):
+        """
+        Redraws the cells whose state changed and returns their rects.
+        Only cells in the difference of the sets since the last call
+        are looked at, unless lost or stuck changed.
+        """
+        mode = (lost, stuck)
+        if mode != self.mode:
+            dirty = self.game.neighbors.coords
+        else:
+            dirty = (revealed ^ self.revealed) | (flags ^ self.flags) | (safes ^ self.safes)
+            if not dirty:
+                return []
+        self.mode = mode
+        self.revealed = set(revealed)
+        self.flags = set(flags)
+        self.safes = set(safes)
+
+        rects = []
+        for cell in dirty:
+            state = self.state(cell, revealed, flags, safes, lost, stuck)
+            if self.drawn.get(cell) == state:
+                continue
+            self.drawn[cell] = state
+            rects.append(self.draw_cell(cell, state))
+        return rects
@@ -0,0 +1,110 @@
+import argparse
+import cProfile
+import json
+import time
+
+from minesweeper import *
+
+REPLAY_VERSION = 1
+
+
+def save_replay(path, game, ai):
+    """
+    Writes the board, every move of the AI and the mine and safe cells
+    it knows to a JSON replay file. The mines are stored as cells, so
+    replays do not depend on the seed.
+    """
+    replay = {
+        "version": REPLAY_VERSION,
+        "height": game.height,
+        "width": game.width,
+        "seed": game.seed,
+        "use_numpy": game.use_numpy,
+        "linear": ai.linear,
+        "probing": ai.probing,
+        "mines": sorted([i, j] for i, j in game.mines),
+        "moves": [list(move) for move in ai.moves],
+        "found": known_cells(ai),
+    }
+    with open(path, "w") as f:
+        json.dump(replay, f, separators=(",", ":"))
+
+
+def known_cells(ai):
+    # The cells the AI knows, sorted [i, j] lists like the mines
+    return {"mines": sorted([i, j] for i, j, _ in ai.mines),
+            "safes": sorted([i, j] for i, j, _ in ai.safes)}
+
+
+def load_replay(path):
+    with open(path) as f:
+        replay = json.load(f)
+    if replay.get("version") != REPLAY_VERSION:
+        raise ValueError(f"unsupported replay version {replay.get('version')!r}")
+    return replay
+
+
+def run_replay(replay):
+    """
+    Re-runs a recorded game through the AI without the GUI.
+    User and random moves are taken from the log, the deductions are
+    derived again.
+    Returns the game, the AI and the time of every add_knowledge call.
+    """
+    height, width = replay["height"], replay["width"]
+    game = Minesweeper.from_mines(height, width, replay["mines"], use_numpy=replay["use_numpy"])
+    ai = MinesweeperAI(height=height, width=width, game=game,
+                       linear=replay.get("linear", False), probing=replay.get("probing", False))
+    return game, ai, replay_moves(ai, replay["moves"])
+
+
+def replay_moves(ai, moves):
+    """
+    Plays logged moves (the format of MinesweeperAI.moves) on an AI, its
+    add_knowledge calls derive the deductions again. The "deduced" moves
+    of older replay files are skipped.
+    Returns the time of every add_knowledge call.
+    """
+    times = []
+    for move in moves:
+        if move[0] == "add_knowledge":
+            start = time.perf_counter()
+            # Calls stopped by a deadline logged their number of passes
+            ai.add_knowledge(max_passes=move[1] if len(move) > 1 else None)
+            times.append(time.perf_counter() - start)
+        elif move[0] in ("user", "random", "guess"):
+            ai.init_knowledge((move[1], move[2]), source=move[0])
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run a recorded Minesweeper game headlessly")
+    parser.add_argument("replay", help="Replay file written by main.py --record")
+    parser.add_argument("--profile", default=None,
+                        help="Write cProfile stats of the replay to this path")
+    args = parser.parse_args()
+
+    replay = load_replay(args.replay)
+    if args.profile:
+        profiler = cProfile.Profile()
+        game, ai, times = profiler.runcall(run_replay, replay)
+        profiler.dump_stats(args.profile)
+        print("profile written to", args.profile)
+    else:
+        game, ai, times = run_replay(replay)
+
+    found = known_cells(ai)
+    print(f"{replay['height']}x{replay['width']}/{len(replay['mines'])}: "
+          f"{len(times)} add_knowledge calls, {sum(times) * 1000:.2f} ms total, "
+          f"slowest {max(times, default=0) * 1000:.2f} ms")
+    print("mines and safe cells found:", len(found["mines"]), len(found["safes"]))
+    recorded = replay.get("found")
+    # Files of the previous format only recorded [mines, safe cells] counts
+    if isinstance(recorded, list):
+        found = [len(found["mines"]), len(found["safes"])]
+    if recorded is not None and recorded != found:
+        print("deductions differ from the recording")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmark import PRESETS, play_game, positive_nonzero_int, summarize
+
+# Options of a configuration name, e.g. "numpy+linear", "plain" has none
+CONFIG_OPTIONS = ("plain", "numpy", "guess", "linear", "probing")
+
+
+def parse_config(config):
+    """
+    Returns the play_game keyword arguments of a configuration name
+    "option[+option...]".
+    """
+    options = config.split("+")
+    for option in options:
+        if option not in CONFIG_OPTIONS:
+            raise argparse.ArgumentTypeError(f"unknown option {option!r} in {config!r}")
+    return {"use_numpy": "numpy" in options, "guess": "guess" in options,
+            "linear": "linear" in options, "probing": "probing" in options}
+
+
+def run_task(task):
+    # Runs in a worker process
+    board, height, width, mines, config, seed, stats = task
+    result = play_game(height, width, mines, seed, stats=stats, **parse_config(config))
+    result["board"] = board
+    result["config"] = config
+    return result
+
+
+def merge_functions(results):
+    # Sums the per-game method counters of play_game(stats=True)
+    merged = {}
+    for r in results:
+        for name, stats in r.get("functions", {}).items():
+            total = merged.setdefault(name, {"calls": 0, "time": 0.0})
+            total["calls"] += stats["calls"]
+            total["time"] += stats["time"]
+    for total in merged.values():
+        total["time_per_game"] = total["time"] / len(results)
+    return merged
+
+
+def run_tournament(boards, configs, games, seed, workers=None, stats=False):
+    """
+    Plays the same seeds with every configuration, spread over a process pool.
+    Returns the merged report.
+    """
+    tasks = [(name, h, w, m, config, seed + k, stats)
+             for name, h, w, m in boards
+             for k in range(games)
+             for config in configs]
+    workers = workers or os.cpu_count() or 1
+    # Large chunks keep the inter-process traffic small next to the games
+    chunksize = max(1, len(tasks) // (workers * 4))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_task, tasks, chunksize=chunksize))
+    wall_time = time.perf_counter() - start
+
+    report = []
+    for name, h, w, m in boards:
+        baseline = None
+        for config in configs:
+            group = [r for r in results if r["board"] == name and r["config"] == config]
+            # Games ran in parallel, so the time of a group is the sum of its game times
+            summary = summarize(name, h, w, m, group, sum(r["game_time"] for r in group))
+            summary["config"] = config
+            summary["add_knowledge_total"] = sum(r["add_knowledge_time"] for r in group)
+            summary["mean_peak_kb"] = sum(r["peak_kb"] for r in group) / len(group)
+            if stats:
+                summary["functions"] = merge_functions(group)
+                summary["passes"] = sum(r["passes"] for r in group)
+            # Speedup of add_knowledge against the first configuration
+            if baseline is None:
+                baseline = summary["add_knowledge_total"]
+            summary["speedup"] = baseline / summary["add_knowledge_total"] if summary["add_knowledge_total"] else 0.0
+            report.append(summary)
+
+    return {
+        "seed": seed,
+        "games": games,
+        "configs": configs,
+        "workers": workers,
+        "wall_time": wall_time,
+        "games_per_sec": len(tasks) / wall_time if wall_time else 0.0,
+        "boards": report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MinesweeperAI configurations on the same seeds")
+    parser.add_argument("-c", "--configs", nargs="+", default=["plain", "probing"],
+                        help="Configurations \"option[+option...]\" of " + ", ".join(CONFIG_OPTIONS) + ", the first one is the speedup baseline")
+    parser.add_argument("-p", "--preset", choices=sorted(PRESETS), nargs="+", default=["beginner", "intermediate", "expert"],
+                        help="Board presets to run")
+    parser.add_argument("-n", "--games", type=positive_nonzero_int, default=100,
+                        help="Number of games per board size")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the first game, game k uses seed + k")
+    parser.add_argument("-j", "--workers", type=positive_nonzero_int, default=None,
+                        help="Worker processes (default: all cores)")
+    parser.add_argument("--stats", action="store_true",
+                        help="Count and time the hot AI methods in every game")
+    parser.add_argument("-o", "--output", default="tournament.json",
+                        help="Path of the JSON report")
+    args = parser.parse_args()
+
+    for config in args.configs:
+        try:
+            parse_config(config)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+
+    boards = [(p,) + PRESETS[p] for p in args.preset]
+    report = run_tournament(boards, args.configs, args.games, args.seed, args.workers, args.stats)
+
+    for summary in report["boards"]:
+        print(f"{summary['name']} [{summary['config']}]: "
+              f"add_knowledge p50 {summary['add_knowledge_p50'] * 1000:.2f} ms, "
+              f"p99 {summary['add_knowledge_p99'] * 1000:.2f} ms, "
+              f"speedup {summary['speedup']:.2f}x, "
+              f"peak KB {summary['peak_kb']}, "
+              f"win {summary['win_rate']:.1%}, lost {summary['lost_rate']:.1%}, "
+              f"stuck {summary['stuck_rate']:.1%}")
+    print(f"{report['games_per_sec']:.2f} games/s on {report['workers']} workers")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("report written to", args.output)
+
+
+if __name__ == "__main__":
+    main()